@@ -0,0 +1,263 @@
+from snake_env import EXTRA_FEATURES, _ROT_A, _ROT_B, _view_offsets
+import numpy as np
+
+class SnakeArena:
+    """Free-for-all match of ``num_snakes`` snakes on a wrapping board.
+
+    Snake state lives in arrays: every body is a ring buffer of flat cells
+    (head at ``head_ptr``), and a shared per-cell ``owner`` grid (-1 = empty)
+    answers "who is there" for all heads at once. A tick moves every snake in
+    one vectorized pass: tails of snakes that do not eat leave first, then a
+    head dies when it lands on any body or meets another head. A normal tick
+    costs O(num_snakes) whatever the snakes' lengths; only a death touches a
+    whole body (to clear it).
+
+    Observations are the ``SnakeGame`` local view for every snake at once,
+    shape (num_snakes, state_dim): other snakes in channel 0, the snake itself
+    in channel 1 and food in channel 2, with the nearest opponent and the
+    nearest food standing in for "the" opponent and food in the 10 features.
+    A policy trained with ``observation='local'`` can therefore play here.
+    Actions are relative to the heading like in that mode (0 ahead, 1 right,
+    3 left; -1 keeps going), or Direction values with ``relative_actions=False``.
+
+    Rewards are +10 for food, -10 for dying and +5 to a surviving snake whose
+    body killed another. The match ends when at most one snake is left, when
+    it starves (no food for 100 ticks per food eaten plus one) or when no food
+    fits anymore; ``winner`` is then the index of the last or best-scoring
+    snake, or -1 for a draw.
+    """
+
+    _DX = np.array([0, 1, 0, -1])
+    _DY = np.array([-1, 0, 1, 0])
+
+    def __init__(self, num_snakes=4, width=64, height=64, num_food=None, seed=None,
+                 view_size=11, relative_actions=True):
+        if num_snakes < 2:
+            raise ValueError(f"num_snakes must be at least 2, got {num_snakes}")
+        if view_size % 2 == 0:
+            raise ValueError(f"view_size must be odd, got {view_size}")
+        self.num_snakes = num_snakes
+        self.width = width
+        self.height = height
+        self.num_cells = width * height
+        self.num_food = max(1, num_snakes // 2) if num_food is None else num_food
+        self.relative_actions = relative_actions
+        self.view_size = view_size
+        self._view_dx, self._view_dy = _view_offsets(view_size)
+        self._rot_a, self._rot_b = np.array(_ROT_A), np.array(_ROT_B)
+        self.state_dim = view_size * view_size * 3 + EXTRA_FEATURES
+        self.rng = np.random.default_rng(seed)
+
+        n = num_snakes
+        self.body = np.zeros((n, self.num_cells), dtype=np.int32)
+        self.head_ptr = np.zeros(n, dtype=np.int64)
+        self.lengths = np.zeros(n, dtype=np.int64)
+        self.directions = np.zeros(n, dtype=np.int64)
+        self.alive = np.zeros(n, dtype=bool)
+        self.scores = np.zeros(n, dtype=np.int64)
+        self.owner = np.full(self.num_cells, -1, dtype=np.int16)
+        self.food_grid = np.zeros(self.num_cells, dtype=bool)
+        self.food = []
+        self.reset()
+
+    def seed(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self):
+        """Spawn every snake (length 1, random heading) on its own random cell."""
+        n = self.num_snakes
+        self.owner[:] = -1
+        self.food_grid[:] = False
+        self.food = []
+
+        cells = self.rng.choice(self.num_cells, n, replace=False)
+        self.body[:, 0] = cells
+        self.head_ptr[:] = 0
+        self.lengths[:] = 1
+        self.directions[:] = self.rng.integers(0, 4, n)
+        self.alive[:] = True
+        self.scores[:] = 0
+        self.owner[cells] = np.arange(n)
+
+        self._place_food(self.num_food)
+        self.steps = 0
+        self.done = False
+        self.winner = None
+        return self._observe()
+
+    def heads(self):
+        """Flat head cell of every snake (stale for dead snakes)."""
+        return self.body[np.arange(self.num_snakes), self.head_ptr]
+
+    def snake_cells(self, snake):
+        """(x, y) cells of one snake from head to tail, e.g. for drawing."""
+        ptr = (self.head_ptr[snake] - np.arange(self.lengths[snake])) % self.num_cells
+        cells = self.body[snake, ptr]
+        return list(zip((cells % self.width).tolist(), (cells // self.width).tolist()))
+
+    def _place_food(self, count):
+        """Drop up to ``count`` food items on random free cells.
+
+        Random probing finds a free cell in a few tries unless the board is
+        nearly full, where it falls back to scanning. Returns False when the
+        board has no room left.
+        """
+        for _ in range(count):
+            probes = self.rng.integers(0, self.num_cells, 16)
+            free = probes[(self.owner[probes] < 0) & ~self.food_grid[probes]]
+            if len(free):
+                cell = int(free[0])
+            else:
+                free = np.flatnonzero((self.owner < 0) & ~self.food_grid)
+                if len(free) == 0:
+                    return False
+                cell = int(free[self.rng.integers(len(free))])
+            self.food_grid[cell] = True
+            self.food.append(cell)
+        return True
+
+    def step(self, actions=None):
+        """Advance every living snake one cell.
+
+        Returns ``(states, rewards, done, winner)`` with per-snake states and
+        rewards; dead snakes get zero observations and rewards.
+        """
+        n = self.num_snakes
+        if self.done:
+            return self._observe(), np.zeros(n), self.done, self.winner
+
+        self.steps += 1
+
+        # Turn (a snake can't reverse into itself)
+        if actions is not None:
+            actions = np.asarray(actions)
+            if self.relative_actions:
+                actions = np.where(actions >= 0, (actions + self.directions) % 4, actions)
+            turn = self.alive & (actions >= 0) & ((actions - self.directions) % 4 != 2)
+            self.directions[turn] = actions[turn]
+
+        # New heads of the living snakes
+        idx = np.flatnonzero(self.alive)
+        heads = self.body[idx, self.head_ptr[idx]]
+        direction = self.directions[idx]
+        new_heads = (((heads // self.width + self._DY[direction]) % self.height) * self.width
+                     + (heads % self.width + self._DX[direction]) % self.width)
+        eats = self.food_grid[new_heads]
+
+        # Tails of snakes that don't eat move out first, so a head may take a tail's cell
+        movers = idx[~eats]
+        tails = self.body[movers, (self.head_ptr[movers] - self.lengths[movers] + 1) % self.num_cells]
+        self.owner[tails] = -1
+
+        # One pass over all heads: body hits through the owner grid, head-on
+        # meetings through sorting the new head cells
+        hit = self.owner[new_heads]
+        order = np.argsort(new_heads, kind='stable')
+        same = new_heads[order[1:]] == new_heads[order[:-1]]
+        clash = np.zeros(len(idx), dtype=bool)
+        clash[order[1:][same]] = True
+        clash[order[:-1][same]] = True
+        dead = (hit >= 0) | clash
+
+        rewards = np.zeros(n)
+        rewards[idx[dead]] -= 10
+        killers = hit[dead & (hit >= 0) & (hit != idx)]
+        killers = killers[self.alive[killers] & ~np.isin(killers, idx[dead])]
+        np.add.at(rewards, killers, 5)
+
+        # Clear the dead from the board
+        for snake in idx[dead]:
+            ptr = (self.head_ptr[snake] - np.arange(self.lengths[snake])) % self.num_cells
+            self.owner[self.body[snake, ptr]] = -1
+        self.alive[idx[dead]] = False
+
+        # Move the survivors (their tails already left, eaters keep them)
+        survive = ~dead
+        idx, new_heads, eats = idx[survive], new_heads[survive], eats[survive]
+        self.head_ptr[idx] = (self.head_ptr[idx] + 1) % self.num_cells
+        self.body[idx, self.head_ptr[idx]] = new_heads
+        self.owner[new_heads] = idx
+
+        # Food
+        eaters = idx[eats]
+        room = True
+        if len(eaters):
+            self.lengths[eaters] += 1
+            self.scores[eaters] += 1
+            rewards[eaters] += 10
+            eaten = new_heads[eats]
+            self.food_grid[eaten] = False
+            eaten = set(eaten.tolist())
+            self.food = [cell for cell in self.food if cell not in eaten]
+            room = self._place_food(len(eaters))
+
+        # End of the match
+        alive = np.flatnonzero(self.alive)
+        if len(alive) <= 1:
+            self.done = True
+            self.winner = int(alive[0]) if len(alive) else -1
+        elif not room or self.steps > 100 * (self.scores.sum() + 1):
+            self.done = True
+            self.winner = self._winner_by_score(alive)
+
+        return self._observe(), rewards, self.done, self.winner
+
+    def _winner_by_score(self, alive):
+        scores = self.scores[alive]
+        best = np.flatnonzero(scores == scores.max())
+        return int(alive[best[0]]) if len(best) == 1 else -1
+
+    def _observe(self):
+        """Local views of every snake, laid out like ``SnakeGame._get_local_state``."""
+        n = self.num_snakes
+        states = np.zeros((n, self.state_dim), dtype=np.float32)
+        idx = np.flatnonzero(self.alive)
+        m = len(idx)
+        if m == 0:
+            return states
+
+        heads = self.body[idx, self.head_ptr[idx]]
+        hx, hy = heads % self.width, heads // self.width
+        heading = self.directions[idx]
+        cells = (((hy[:, None] + self._view_dy[heading]) % self.height) * self.width
+                 + (hx[:, None] + self._view_dx[heading]) % self.width)
+        owner = self.owner[cells]
+
+        v = cells.shape[1]
+        grid = np.zeros((m, v, 3), dtype=np.float32)
+        grid[:, :, 0] = (owner >= 0) & (owner != idx[:, None])
+        grid[:, :, 1] = owner == idx[:, None]
+        grid[:, :, 2] = self.food_grid[cells]
+        states[idx, :3 * v] = grid.reshape(m, -1)
+
+        extra = np.zeros((m, EXTRA_FEATURES))
+        rows = np.arange(m)
+
+        # Nearest other living snake: relative heading and length
+        if m > 1:
+            distance = np.abs(hx[:, None] - hx) + np.abs(hy[:, None] - hy)
+            np.fill_diagonal(distance, self.width + self.height)
+            nearest = distance.argmin(axis=1)
+            extra[rows, (heading[nearest] - heading) % 4] = 1.0
+            other_length = self.lengths[idx[nearest]]
+            extra[:, 9] = other_length / (other_length + 10)
+
+        # Nearest food: direction in the view frame and proximity
+        if self.food:
+            food = np.array(self.food)
+            food_dx = food % self.width - hx[:, None]
+            food_dy = food // self.width - hy[:, None]
+            distance = np.abs(food_dx) + np.abs(food_dy)
+            nearest = distance.argmin(axis=1)
+            food_dx, food_dy, distance = food_dx[rows, nearest], food_dy[rows, nearest], distance[rows, nearest]
+            norm = np.maximum(distance, 1)
+            rot_a, rot_b = self._rot_a[heading], self._rot_b[heading]
+            extra[:, 4] = (rot_a * food_dx + rot_b * food_dy) / norm
+            extra[:, 5] = (-rot_b * food_dx + rot_a * food_dy) / norm
+            extra[:, 6] = 1 / (1 + distance)
+
+        extra[:, 7] = max(0.0, 1 - self.steps / (100 * (self.scores.sum() + 1)))
+        length = self.lengths[idx]
+        extra[:, 8] = length / (length + 10)
+        states[idx, 3 * v:] = extra
+        return states
@@ -0,0 +1,353 @@
+from snake_env import SnakeGame, VecSnakeGame, Direction
+from arena import SnakeArena
+from planner import BFSPlanner, VecBFSPlanner
+from dqn_agent import DQNAgent, ReplayBuffer, PrioritizedReplayBuffer
+from collections import deque
+from datetime import datetime
+import numpy as np
+import torch
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+def make_long_snake_game(length, width=36, height=36, seed=0):
+    """Build a game where snake2 has ``length`` segments and a free row ahead."""
+    env = SnakeGame(width=width, height=height, gui=False, seed=seed)
+
+    # Head on the top row moving left; the body snakes back and forth below it
+    body = [(width - 1, 0)]
+    for i in range(length - 1):
+        row, col = divmod(i, width)
+        x = col if row % 2 == 0 else width - 1 - col
+        body.append((x, 1 + row))
+
+    env.snake2 = deque(body)
+    env.snake1 = deque([(0, height - 1)])
+    env.direction1 = Direction.RIGHT
+    env.direction2 = Direction.LEFT
+    env._rebuild_caches()
+    env._place_food()
+    env.last_food_distance2 = env._food_distance(2)
+    return env
+
+def bench_step_by_length(lengths=(1, 50, 200, 500), steps_per_game=30, repeats=50,
+                         width=36, height=36):
+    """Average SnakeGame.step time (microseconds) for different snake lengths.
+    
+    Lengths whose body would reach the bottom row of the board are skipped.
+    """
+    steps_per_game = min(steps_per_game, width - 1)
+    results = {}
+    for length in lengths:
+        if length - 1 > width * (height - 2):
+            continue
+        total = 0.0
+        for i in range(repeats):
+            env = make_long_snake_game(length, width, height, seed=i)
+            start = time.perf_counter()
+            for _ in range(steps_per_game):
+                env.step()
+            total += time.perf_counter() - start
+        results[length] = total / (repeats * steps_per_game) * 1e6
+    return results
+
+def _rate(fn, calls, repeats=3, ops_per_call=1):
+    """Operations per second of ``fn``: median over ``repeats`` timed runs of
+    ``calls`` calls each, after one warm-up call."""
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        times.append(time.perf_counter() - start)
+    return ops_per_call * calls / float(np.median(times))
+
+def _random_transitions(n, state_dim, rng):
+    return (rng.random((n, state_dim), dtype=np.float32), rng.integers(0, 4, n),
+            rng.normal(size=n).astype(np.float32), rng.random((n, state_dim), dtype=np.float32),
+            (rng.random(n) < 0.1).astype(np.float32))
+
+def bench_observation(width=36, height=36, num_envs=64, calls=2000, seed=0):
+    """Observation encodings per second for SnakeGame and VecSnakeGame."""
+    env = SnakeGame(width=width, height=height, gui=False, seed=seed)
+    vec_env = VecSnakeGame(num_envs, width=width, height=height, seed=seed)
+    idx = np.arange(num_envs)
+    return {
+        'single': _rate(env._get_state, calls),
+        'vec': _rate(lambda: vec_env._get_states(idx), max(calls // num_envs, 10),
+                     ops_per_call=num_envs),
+    }
+
+def bench_replay(state_dim=3898, capacity=8192, batch_size=128, add_batch_size=64, calls=500, seed=0):
+    """Replay add / add_batch throughput (transitions per second) and sample
+    throughput (batches per second) for uniform and prioritized memories.
+    
+    The memory is filled first, so adds measure the steady state (overwriting
+    the oldest slots) rather than first-touch page faults.
+    """
+    rng = np.random.default_rng(seed)
+    transitions = _random_transitions(add_batch_size, state_dim, rng)
+    single = tuple(column[0] for column in transitions)
+    results = {}
+    for name, cls in (('uniform', ReplayBuffer), ('prioritized', PrioritizedReplayBuffer)):
+        memory = cls(capacity, state_dim, seed=seed)
+        while len(memory) < capacity:
+            memory.add_batch(*transitions)
+        results[f'{name}/add'] = _rate(lambda: memory.add(*single), calls)
+        results[f'{name}/add_batch'] = _rate(lambda: memory.add_batch(*transitions),
+                                             max(calls // 10, 10), ops_per_call=add_batch_size)
+        results[f'{name}/sample'] = _rate(lambda: memory.sample(batch_size), calls)
+    return results
+
+def _make_agent(state_dim, batch_size, memory_size, seed, **options):
+    torch.manual_seed(seed)
+    agent = DQNAgent(state_dim, 4, torch.device("cpu"), batch_size=batch_size,
+                     memory_size=memory_size, **options)
+    agent.memory.rng = np.random.default_rng(seed)
+    return agent
+
+def bench_learner(state_dim=3898, batch_sizes=(32, 128, 512), updates=30, seed=0):
+    """DQNAgent.replay updates per second at several batch sizes (CPU, float32)."""
+    rng = np.random.default_rng(seed)
+    results = {}
+    for batch_size in batch_sizes:
+        n = 2 * batch_size
+        agent = _make_agent(state_dim, batch_size, n, seed)
+        agent.remember_batch(*_random_transitions(n, state_dim, rng))
+        results[batch_size] = _rate(agent.replay, updates, repeats=1)
+    return results
+
+def bench_act_latency(state_dim=3898, batch_size=64, calls=300, seed=0):
+    """Greedy action latency (microseconds) for one state vs. one batch."""
+    rng = np.random.default_rng(seed)
+    agent = _make_agent(state_dim, 32, 32, seed)
+    states = rng.random((batch_size, state_dim), dtype=np.float32)
+    single = _rate(lambda: agent.act(states[0], evaluation=True), calls)
+    batched = _rate(lambda: agent.act_batch(states, evaluation=True), max(calls // 10, 10))
+    return {
+        'single_us': 1e6 / single,
+        'batch_us': 1e6 / batched,
+        'batch_states_per_sec': batched * batch_size,
+    }
+
+def bench_render(width=36, height=36, frames=100, seed=0):
+    """Headless SnakeGame.render frames per second (SDL dummy video driver)."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    env = SnakeGame(width=width, height=height, gui=True, seed=seed)
+    elapsed = 0.0
+    try:
+        for _ in range(frames):
+            if env.done:
+                env.reset()
+            env.step()
+            start = time.perf_counter()
+            env.render()
+            elapsed += time.perf_counter() - start
+    finally:
+        env.close()
+    return frames / elapsed
+
+def bench_arena(num_snakes=32, width=100, height=100, ticks=500, seed=0):
+    """SnakeArena ticks per second with mostly-straight random moves (new
+    matches start as old ones end)."""
+    rng = np.random.default_rng(seed)
+    arena = SnakeArena(num_snakes, width, height, seed=seed)
+    actions = rng.choice([0, 0, 0, 0, 1, 3], (ticks, num_snakes))
+    elapsed = 0.0
+    for tick_actions in actions:
+        start = time.perf_counter()
+        _, _, done, _ = arena.step(tick_actions)
+        elapsed += time.perf_counter() - start
+        if done:
+            arena.reset()
+    return ticks / elapsed
+
+def bench_planner(width=36, height=36, num_envs=64, ticks=300, seed=0):
+    """Decisions/sec of BFSPlanner and VecBFSPlanner steering snake1 against
+    the idle snake2 (only ``act`` is timed; games restart as they end)."""
+    env = SnakeGame(width=width, height=height, gui=False, seed=seed)
+    planner = BFSPlanner(snake_num=1)
+    env.reset()
+    elapsed = 0.0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        action = planner.act(env)
+        elapsed += time.perf_counter() - start
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    single = ticks / elapsed
+    
+    envs = VecSnakeGame(num_envs, width=width, height=height, seed=seed)
+    vec_planner = VecBFSPlanner(snake=0)
+    envs.reset()
+    elapsed = 0.0
+    for _ in range(ticks):
+        start = time.perf_counter()
+        actions = vec_planner.act(envs)
+        elapsed += time.perf_counter() - start
+        envs.step(actions)
+    return {'single': single, f'vec{num_envs}': ticks * num_envs / elapsed}
+
+def bench_learner_modes(state_dim=3898, batch_size=128, updates=50, seed=0):
+    """Updates/sec of the eager float32 learner against the fast learner modes.
+    
+    Every mode starts from the same weights and is checked on the same batch,
+    so the reported loss difference shows how close it stays to eager float32.
+    """
+    modes = {
+        'eager': {},
+        'bf16': {'mixed_precision': True},
+        'compiled': {'compile_model': True},
+        'compiled+bf16': {'mixed_precision': True, 'compile_model': True},
+    }
+    rng = np.random.default_rng(seed)
+    n = 4 * batch_size
+    transitions = _random_transitions(n, state_dim, rng)
+    device = torch.device("cpu")
+    
+    torch.manual_seed(seed)
+    reference = None
+    results = {}
+    for name, options in modes.items():
+        agent = DQNAgent(state_dim, 4, device, batch_size=batch_size, memory_size=n, **options)
+        if reference is None:
+            reference = agent
+        else:
+            agent.model.load_state_dict(reference.model.state_dict())
+            agent.target_model.load_state_dict(reference.target_model.state_dict())
+        agent.remember_batch(*transitions)
+        
+        batch = [torch.from_numpy(column) for column in agent.memory.sample(batch_size)]
+        with torch.no_grad():
+            loss = agent.compute_loss(*batch)[0].item()
+            reference_loss = reference._compute_loss(*batch)[0].item()
+        
+        # Warm-up (triggers compilation), then timed updates
+        for _ in range(3):
+            agent.replay()
+        start = time.perf_counter()
+        for _ in range(updates):
+            agent.replay()
+        results[name] = {
+            'updates_per_sec': updates / (time.perf_counter() - start),
+            'loss_rel_diff': abs(loss - reference_loss) / max(abs(reference_loss), 1e-12),
+        }
+    return results
+
+def run_suite(quick=False, seed=0):
+    """Run every benchmark with fixed seeds.
+    
+    Returns ``{name: {'value', 'unit', 'higher_is_better'}}``; names are stable
+    so results from different runs can be passed to ``compare``.
+    """
+    scale = 0.2 if quick else 1.0
+    results = {}
+    
+    def add(name, value, unit, higher_is_better=True):
+        results[name] = {'value': float(value), 'unit': unit, 'higher_is_better': higher_is_better}
+    
+    for size in (16, 36, 64):
+        per_step = bench_step_by_length(repeats=max(int(50 * scale), 5), width=size, height=size)
+        for length, us in per_step.items():
+            add(f'env_step/{size}x{size}/len{length}', 1e6 / us, 'steps/s')
+        for kind, rate in bench_observation(size, size, calls=int(2000 * scale), seed=seed).items():
+            add(f'observation/{kind}/{size}x{size}', rate, 'states/s')
+    
+    for name, rate in bench_replay(calls=int(500 * scale), seed=seed).items():
+        unit = 'batches/s' if name.endswith('sample') else 'transitions/s'
+        add(f'replay/{name}', rate, unit)
+    
+    for batch_size, rate in bench_learner(updates=max(int(30 * scale), 5), seed=seed).items():
+        add(f'learner/batch{batch_size}', rate, 'updates/s')
+    
+    latency = bench_act_latency(calls=max(int(300 * scale), 30), seed=seed)
+    add('act/single_latency', latency['single_us'], 'us', higher_is_better=False)
+    add('act/batch64_latency', latency['batch_us'], 'us', higher_is_better=False)
+    add('act/batch64_throughput', latency['batch_states_per_sec'], 'states/s')
+    
+    add('render/36x36', bench_render(frames=max(int(100 * scale), 10), seed=seed), 'frames/s')
+    
+    for num_snakes, size in ((8, 36), (64, 100)):
+        add(f'arena/{num_snakes}snakes/{size}x{size}',
+            bench_arena(num_snakes, size, size, ticks=max(int(500 * scale), 50), seed=seed), 'ticks/s')
+    
+    for kind, rate in bench_planner(ticks=max(int(300 * scale), 30), seed=seed).items():
+        add(f'planner/{kind}/36x36', rate, 'decisions/s')
+    return results
+
+def environment_info(seed, quick):
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'torch': torch.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'torch_threads': torch.get_num_threads(),
+        'seed': seed,
+        'quick': quick,
+    }
+
+def compare(baseline, current, threshold=0.1):
+    """Benchmarks that got more than ``threshold`` (fractional) slower.
+    
+    Returns ``[(name, baseline_value, current_value, slowdown)]``; benchmarks
+    missing from either run are ignored.
+    """
+    regressions = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['value'], result['value']
+        if result['higher_is_better']:
+            slowdown = 1 - new / old if old > 0 else 0.0
+        else:
+            slowdown = 1 - old / new if new > 0 else 0.0
+        if slowdown > threshold:
+            regressions.append((name, old, new, slowdown))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the simulator, replay memory, learner and renderer")
+    parser.add_argument("--output", default=None,
+                        help="write results to this JSON file")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON file from an earlier run to check for slowdowns")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="fractional slowdown against the baseline that counts as a regression")
+    parser.add_argument("--quick", action="store_true",
+                        help="fewer repetitions (noisier, for smoke tests)")
+    parser.add_argument("--learner-modes", action="store_true",
+                        help="also compare eager, bf16 and compiled learners")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    results = run_suite(quick=args.quick, seed=args.seed)
+    for name, result in results.items():
+        print(f"{name:36s} {result['value']:14.1f} {result['unit']}")
+    
+    if args.learner_modes:
+        for name, result in bench_learner_modes(seed=args.seed).items():
+            print(f"Learner {name:14s}: {result['updates_per_sec']:7.1f} updates/sec, "
+                  f"loss rel. diff vs eager {result['loss_rel_diff']:.2e}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment_info(args.seed, args.quick),
+                       'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(baseline, results, args.threshold)
+        for name, old, new, slowdown in regressions:
+            print(f"REGRESSION {name}: {old:.1f} -> {new:.1f} ({slowdown:.0%} slower)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
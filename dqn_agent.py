@@ -1,10 +1,13 @@
 import numpy as np
 import random
-from collections import deque
+import os
+import queue
+import threading
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import torch.nn.functional as F
+from profiler import PROFILER, timed
 
 class DQN(nn.Module):
     def __init__(self, input_dim, output_dim):
@@ -26,13 +29,375 @@ class DQN(nn.Module):
         x = F.relu(self.fc3(x))
         return self.fc4(x)
 
+class ConvDQN(nn.Module):
+    """Q-network that reads the grid part of the state as a 3-channel image.
+
+    The first ``height * width * 3`` inputs are reshaped to the (height, width, 3)
+    layout of ``SnakeGame._get_state`` (the view size with local observations)
+    and run through strided convolutions. The
+    input is padded by wrapping one cell around each edge, so the first layer
+    sees the toroidal board exactly; later layers use cheap zero padding. The
+    trailing direction and food features go through their own small layer and
+    are fused before the head.
+    """
+    def __init__(self, input_dim, output_dim, height, width, extra_dim=10):
+        super(ConvDQN, self).__init__()
+        if height * width * 3 + extra_dim != input_dim:
+            raise ValueError(f"A {width}x{height} board does not match state size {input_dim}")
+        self.height = height
+        self.width = width
+        self.grid_dim = height * width * 3
+        
+        self.conv1 = nn.Conv2d(3, 16, 3, stride=2)
+        self.conv2 = nn.Conv2d(16, 32, 3, stride=2, padding=1)
+        self.conv3 = nn.Conv2d(32, 32, 3, stride=2, padding=1)
+        
+        conv_h, conv_w = height, width
+        for _ in range(3):
+            conv_h, conv_w = (conv_h + 1) // 2, (conv_w + 1) // 2
+        self.fc_extra = nn.Linear(input_dim - self.grid_dim, 32)
+        self.fc1 = nn.Linear(32 * conv_h * conv_w + 32, 256)
+        self.fc2 = nn.Linear(256, output_dim)
+        
+        # Initialize weights using Kaiming initialization
+        for m in self.modules():
+            if isinstance(m, (nn.Linear, nn.Conv2d)):
+                nn.init.kaiming_normal_(m.weight, mode='fan_in', nonlinearity='relu')
+                nn.init.zeros_(m.bias)
+    
+    def forward(self, x):
+        single = x.dim() == 1
+        if single:
+            x = x.unsqueeze(0)
+        
+        grid = x[:, :self.grid_dim].reshape(-1, self.height, self.width, 3).permute(0, 3, 1, 2)
+        grid = F.relu(self.conv1(F.pad(grid, (1, 1, 1, 1), mode='circular')))
+        grid = F.relu(self.conv2(grid))
+        grid = F.relu(self.conv3(grid))
+        extra = F.relu(self.fc_extra(x[:, self.grid_dim:]))
+        
+        x = torch.cat([grid.flatten(1), extra], dim=1)
+        x = self.fc2(F.relu(self.fc1(x)))
+        return x.squeeze(0) if single else x
+
+# Q-network classes selectable by name; the name is stored in checkpoints
+ARCHITECTURES = {
+    'mlp': DQN,
+    'conv': ConvDQN,
+}
+
+def build_network(architecture, state_dim, action_dim, width=None, height=None):
+    """Q-network by architecture name; the conv one also needs the width and
+    height of the grid in the state."""
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture {architecture!r}, expected one of {sorted(ARCHITECTURES)}")
+    if architecture == 'conv':
+        if width is None or height is None:
+            raise ValueError("The conv architecture needs the board width and height")
+        return ConvDQN(state_dim, action_dim, height, width)
+    return ARCHITECTURES[architecture](state_dim, action_dim)
+
+def network_state_dim(architecture, weights, width=None, height=None):
+    """State size the Q-network ``weights`` (a state dict) take."""
+    if architecture == 'conv':
+        return height * width * 3 + weights['fc_extra.weight'].shape[1]
+    return weights['fc1.weight'].shape[1]
+
+class ReplayBuffer:
+    """Fixed-capacity replay memory stored as contiguous NumPy columns.
+
+    Transitions are written into a circular buffer, so memory is allocated once
+    and sampling gathers a whole minibatch with a single fancy-index per column.
+    """
+    def __init__(self, capacity, state_dim, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.pos = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+    
+    def __len__(self):
+        return self.size
+    
+    def add(self, state, action, reward, next_state, done):
+        i = self.pos
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """Store a batch of transitions, e.g. one step of a VecSnakeGame."""
+        n = len(actions)
+        if n > self.capacity:
+            # Only the most recent transitions would survive anyway
+            states, actions, rewards = states[-self.capacity:], actions[-self.capacity:], rewards[-self.capacity:]
+            next_states, dones = next_states[-self.capacity:], dones[-self.capacity:]
+            n = self.capacity
+        idx = (self.pos + np.arange(n)) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = dones
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+    
+    def state_dict(self):
+        """Stored transitions (copied, oldest slot order kept) plus cursor and RNG."""
+        n = self.size
+        return {
+            'states': self.states[:n].copy(),
+            'actions': self.actions[:n].copy(),
+            'rewards': self.rewards[:n].copy(),
+            'next_states': self.next_states[:n].copy(),
+            'dones': self.dones[:n].copy(),
+            'pos': self.pos,
+            'rng_state': self.rng.bit_generator.state,
+        }
+    
+    def load_state_dict(self, state):
+        n = min(len(state['actions']), self.capacity)
+        self.states[:n] = state['states'][:n]
+        self.actions[:n] = state['actions'][:n]
+        self.rewards[:n] = state['rewards'][:n]
+        self.next_states[:n] = state['next_states'][:n]
+        self.dones[:n] = state['dones'][:n]
+        self.size = n
+        self.pos = state['pos'] % self.capacity
+        self.rng.bit_generator.state = state['rng_state']
+    
+    def sample(self, batch_size):
+        idx = self.rng.integers(0, self.size, size=batch_size)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx])
+
+class SumTree:
+    """Array-backed binary sum-tree over ``capacity`` leaf priorities.
+
+    Node ``i`` has children ``2i`` and ``2i + 1``; leaves start at ``self.leaves``
+    (capacity rounded up to a power of two). Updates and proportional sampling
+    are vectorized over a whole batch and cost O(log N) per element;
+    ``update_one`` is the plain loop for a single leaf.
+    """
+    def __init__(self, capacity):
+        self.leaves = 1
+        while self.leaves < capacity:
+            self.leaves *= 2
+        self.depth = self.leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaves, dtype=np.float64)
+    
+    @property
+    def total(self):
+        return self.tree[1]
+    
+    def update(self, indices, priorities):
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+    
+    def update_one(self, index, priority):
+        tree = self.tree
+        node = index + self.leaves
+        tree[node] = priority
+        node //= 2
+        while node:
+            tree[node] = tree[2 * node] + tree[2 * node + 1]
+            node //= 2
+    
+    def get(self, indices):
+        return self.tree[np.asarray(indices, dtype=np.int64) + self.leaves]
+    
+    def find(self, values):
+        """Leaf indices whose cumulative priority range contains each value."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = self.tree[2 * nodes]
+            go_right = values >= left
+            values -= left * go_right
+            nodes = 2 * nodes + go_right
+        return nodes - self.leaves
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+    """Replay memory sampling transitions proportionally to ``priority ** alpha``.
+
+    New transitions get the largest priority seen so far, so each is likely to
+    be replayed at least once; ``update_priorities`` feeds back TD errors.
+    """
+    def __init__(self, capacity, state_dim, alpha=0.6, epsilon=1e-5, seed=None):
+        super().__init__(capacity, state_dim, seed=seed)
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity)
+    
+    def add(self, state, action, reward, next_state, done):
+        i = self.pos
+        super().add(state, action, reward, next_state, done)
+        self.tree.update_one(i, self.max_priority ** self.alpha)
+    
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        n = min(len(actions), self.capacity)
+        idx = (self.pos + np.arange(n)) % self.capacity
+        super().add_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(idx, np.full(n, self.max_priority ** self.alpha))
+    
+    def sample(self, batch_size, beta=0.4):
+        """Return the transition columns plus sampled indices and normalized
+        importance-sampling weights."""
+        # Stratified draw: one value from each of batch_size equal slices
+        total = self.tree.total
+        segment = total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        idx = np.minimum(self.tree.find(np.minimum(values, total * (1 - 1e-12))), self.size - 1)
+        
+        probs = self.tree.get(idx) / total
+        weights = (self.size * np.maximum(probs, 1e-12)) ** -beta
+        weights = (weights / weights.max()).astype(np.float32)
+        return (self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx], idx, weights)
+    
+    def state_dict(self):
+        state = super().state_dict()
+        state['priorities'] = self.tree.get(np.arange(self.size))
+        state['max_priority'] = self.max_priority
+        return state
+    
+    def load_state_dict(self, state):
+        super().load_state_dict(state)
+        self.tree = SumTree(self.capacity)
+        self.tree.update(np.arange(self.size), state['priorities'][:self.size])
+        self.max_priority = state['max_priority']
+    
+    def update_priorities(self, indices, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
+
+class BatchPrefetcher:
+    """Prepares upcoming minibatches on a background thread.
+
+    ``sample_fn`` returns a tuple of NumPy columns. The thread copies each batch
+    into one of ``num_batches`` reusable host tensor slots (pinned when the
+    device is CUDA) so ``get`` only has to issue a non-blocking device copy.
+    A slot is recycled on the following ``get`` call, once its step is done.
+    """
+    def __init__(self, sample_fn, device, num_batches=2):
+        self.sample_fn = sample_fn
+        self.device = device
+        self.pin_memory = device.type == 'cuda'
+        self.slots = [None] * num_batches
+        self.free_slots = queue.Queue()
+        self.ready_slots = queue.Queue()
+        for i in range(num_batches):
+            self.free_slots.put(i)
+        self.in_use = None
+        self.error = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+    
+    def _worker(self):
+        try:
+            while True:
+                i = self.free_slots.get()
+                if self.stop_event.is_set():
+                    return
+                batch = self.sample_fn()
+                if self.slots[i] is None:
+                    self.slots[i] = [torch.empty(column.shape, dtype=torch.from_numpy(column).dtype,
+                                                 pin_memory=self.pin_memory) for column in batch]
+                for tensor, column in zip(self.slots[i], batch):
+                    tensor.copy_(torch.from_numpy(column))
+                self.ready_slots.put(i)
+        except Exception as e:
+            self.error = e
+            self.ready_slots.put(None)
+    
+    def get(self):
+        """Return the next batch as tensors on the device."""
+        if self.in_use is not None:
+            self.free_slots.put(self.in_use)
+        i = self.ready_slots.get()
+        if i is None:
+            raise RuntimeError("Batch prefetch thread failed") from self.error
+        self.in_use = i
+        return [tensor.to(self.device, non_blocking=True) for tensor in self.slots[i]]
+    
+    def close(self):
+        self.stop_event.set()
+        self.free_slots.put(None)
+        self.thread.join(timeout=5)
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """Set PyTorch's CPU thread pools.
+
+    The inter-op pool can only be sized before PyTorch runs any parallel work,
+    so call this at start-up; a late call leaves that pool unchanged.
+    """
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            print(f"Could not set inter-op threads: {e}")
+
+def _cpu_copy(obj):
+    """Deep copy of a (nested) state dict with every tensor cloned onto the CPU."""
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: _cpu_copy(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_cpu_copy(value) for value in obj)
+    return obj
+
+def save_atomic(obj, path):
+    """torch.save to a temporary file, then rename it over ``path``, so readers
+    never see a partially written checkpoint."""
+    tmp_path = f"{path}.tmp"
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
 class DQNAgent:
     def __init__(self, state_dim, action_dim, device, lr=0.00025, gamma=0.99, 
                  epsilon=1.0, epsilon_min=0.01, epsilon_decay=0.9995,
-                 batch_size=128, target_update_freq=1000):
+                 batch_size=128, target_update_freq=1000, memory_size=100000,
+                 prioritized_replay=False, per_alpha=0.6, per_beta=0.4, per_beta_steps=100000,
+                 prefetch_batches=0, architecture='mlp', schedule_unit='update',
+                 mixed_precision=False, compile_model=False, width=None, height=None):
         self.state_dim = state_dim
         self.action_dim = action_dim
-        self.memory = deque(maxlen=100000)  # Larger replay buffer
+        
+        # Grid size inside the state, needed by the conv architecture
+        self.width = width
+        self.height = height
+        self.lr = lr
+        
+        # Replay memory (uniform, or prioritized by TD error)
+        self.prioritized_replay = prioritized_replay
+        self.per_alpha = per_alpha
+        self._build_memory(memory_size)
+        self.per_beta = per_beta
+        self.per_beta_increment = (1.0 - per_beta) / per_beta_steps
+        
+        # Optional background minibatch preparation (started on first replay);
+        # the lock keeps the sampler thread and remember/priority updates apart
+        self.prefetch_batches = prefetch_batches
+        self.prefetcher = None
+        self.memory_lock = threading.Lock()
+        
         self.gamma = gamma
         self.epsilon = epsilon
         self.epsilon_min = epsilon_min
@@ -41,89 +406,228 @@ class DQNAgent:
         self.target_update_freq = target_update_freq
         self.device = device
         
+        # Epsilon decay and target sync tick per gradient update ('update') or
+        # per transition stored ('env')
+        if schedule_unit not in ('update', 'env'):
+            raise ValueError(f"schedule_unit must be 'update' or 'env', got {schedule_unit!r}")
+        self.schedule_unit = schedule_unit
+        
+        # Fast-learner options: bfloat16 autocast for forward passes and
+        # torch.compile for the acting forward and the loss/backward graph
+        self.mixed_precision = mixed_precision
+        self.compile_model = compile_model
+        
+        self._build_networks(architecture)
+        self.loss_fn = nn.SmoothL1Loss()  # Huber loss
+        
+        self.steps = 0
+        self.env_steps = 0
+    
+    def _build_memory(self, memory_size):
+        if self.prioritized_replay:
+            self.memory = PrioritizedReplayBuffer(memory_size, self.state_dim, alpha=self.per_alpha)
+        else:
+            self.memory = ReplayBuffer(memory_size, self.state_dim)
+    
+    def _build_networks(self, architecture):
+        def network():
+            return build_network(architecture, self.state_dim, self.action_dim,
+                                 self.width, self.height).to(self.device)
+        
         # Main network
-        self.model = DQN(state_dim, action_dim).to(device)
+        self.model = network()
+        self.architecture = architecture
         
         # Target network (for stability)
-        self.target_model = DQN(state_dim, action_dim).to(device)
+        self.target_model = network()
         self.target_model.load_state_dict(self.model.state_dict())
         self.target_model.eval()
         
-        self.optimizer = optim.Adam(self.model.parameters(), lr=lr, eps=1e-4)
-        self.loss_fn = nn.SmoothL1Loss()  # Huber loss
+        self.optimizer = optim.Adam(self.model.parameters(), lr=self.lr, eps=1e-4)
         
-        self.steps = 0
+        if self.compile_model:
+            self.policy = torch.compile(self.model)
+            self.compute_loss = torch.compile(self._compute_loss)
+        else:
+            self.policy = self.model
+            self.compute_loss = self._compute_loss
+    
+    def _autocast(self):
+        return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16,
+                              enabled=self.mixed_precision)
     
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        with self.memory_lock:
+            self.memory.add(state, action, reward, next_state, done)
+        self._count_env_steps(1)
+    
+    def remember_batch(self, states, actions, rewards, next_states, dones):
+        with self.memory_lock:
+            self.memory.add_batch(states, actions, rewards, next_states, dones)
+        self._count_env_steps(len(actions))
+    
+    def _count_env_steps(self, n):
+        if self.schedule_unit == 'env':
+            self._advance_schedule(self.env_steps, n)
+        self.env_steps += n
+    
+    def _advance_schedule(self, start, n):
+        """Apply target sync and epsilon decay for ticks start .. start + n - 1."""
+        # Update target network when a tick lands on a multiple of target_update_freq
+        if (start + n - 1) // self.target_update_freq > (start - 1) // self.target_update_freq:
+            self.target_model.load_state_dict(self.model.state_dict())
+        
+        # Decay epsilon
+        if self.epsilon > self.epsilon_min:
+            self.epsilon *= self.epsilon_decay ** n
     
+    @timed('agent.act')
     def act(self, state, evaluation=False):
         if not evaluation and random.random() <= self.epsilon:
             return random.randint(0, self.action_dim - 1)
         
         state = torch.FloatTensor(state).to(self.device)
-        with torch.no_grad():
-            q_values = self.model(state)
+        with torch.no_grad(), self._autocast():
+            q_values = self.policy(state)
         return torch.argmax(q_values).item()
     
+    @timed('agent.act_batch')
+    def act_batch(self, states, evaluation=False):
+        """Epsilon-greedy actions for a batch of states of shape (N, state_dim).
+        
+        Exploration is drawn per row; a single forward pass covers the rows
+        that act greedily. Returns an int64 NumPy array of N actions.
+        """
+        states = np.asarray(states, dtype=np.float32)
+        n = len(states)
+        if evaluation:
+            greedy = np.ones(n, dtype=bool)
+            actions = np.zeros(n, dtype=np.int64)
+        else:
+            greedy = np.random.random(n) > self.epsilon
+            actions = np.random.randint(0, self.action_dim, size=n).astype(np.int64)
+        
+        if greedy.any():
+            with torch.no_grad(), self._autocast():
+                q_values = self.policy(torch.from_numpy(states[greedy]).to(self.device))
+            actions[greedy] = torch.argmax(q_values, dim=1).cpu().numpy()
+        return actions
+    
     def replay(self):
         if len(self.memory) < self.batch_size:
             return
         
-        # Sample batch from memory
-        minibatch = random.sample(self.memory, self.batch_size)
-        
-        # Convert to tensors and move to device
-        states = torch.FloatTensor(np.array([t[0] for t in minibatch])).to(self.device)
-        actions = torch.LongTensor(np.array([t[1] for t in minibatch])).to(self.device)
-        rewards = torch.FloatTensor(np.array([t[2] for t in minibatch])).to(self.device)
-        next_states = torch.FloatTensor(np.array([t[3] for t in minibatch])).to(self.device)
-        dones = torch.FloatTensor(np.array([t[4] for t in minibatch])).to(self.device)
-        
-        # Current Q values
-        current_q = self.model(states).gather(1, actions.unsqueeze(1))
-        
-        # Next Q values from target network
-        with torch.no_grad():
-            next_q = self.target_model(next_states).max(1)[0]
-            target_q = rewards + (1 - dones) * self.gamma * next_q
+        # Sample batch from memory (tensors on the device)
+        with PROFILER.timer('replay.sample'):
+            if self.prefetch_batches > 0:
+                if self.prefetcher is None:
+                    self.prefetcher = BatchPrefetcher(self._sample_batch, self.device,
+                                                      self.prefetch_batches)
+                batch = self.prefetcher.get()
+            else:
+                batch = [torch.from_numpy(column).to(self.device) for column in self._sample_batch()]
+        weights = batch[6] if self.prioritized_replay else None
         
         # Compute loss and update
-        loss = self.loss_fn(current_q.squeeze(), target_q)
+        with PROFILER.timer('learner.forward'):
+            loss, td_errors = self.compute_loss(*batch[:5], weights)
         
-        self.optimizer.zero_grad()
-        loss.backward()
+        # TD errors become the new priorities
+        if self.prioritized_replay:
+            with PROFILER.timer('replay.update_priorities'), self.memory_lock:
+                self.memory.update_priorities(batch[5].cpu().numpy(), td_errors.cpu().numpy())
+            self.per_beta = min(1.0, self.per_beta + self.per_beta_increment)
         
-        # Gradient clipping
-        torch.nn.utils.clip_grad_norm_(self.model.parameters(), 10)
-        self.optimizer.step()
+        with PROFILER.timer('learner.backward'):
+            self.optimizer.zero_grad()
+            loss.backward()
+            
+            # Gradient clipping
+            torch.nn.utils.clip_grad_norm_(self.model.parameters(), 10)
+            self.optimizer.step()
+        PROFILER.count('learner.updates')
         
-        # Update target network
-        if self.steps % self.target_update_freq == 0:
-            self.target_model.load_state_dict(self.model.state_dict())
-        
-        # Decay epsilon
-        if self.epsilon > self.epsilon_min:
-            self.epsilon *= self.epsilon_decay
+        # Update target network and decay epsilon
+        if self.schedule_unit == 'update':
+            self._advance_schedule(self.steps, 1)
         
         self.steps += 1
         return loss.item()
     
-    def save(self, path):
-        torch.save({
-            'model_state_dict': self.model.state_dict(),
-            'target_model_state_dict': self.target_model.state_dict(),
-            'optimizer_state_dict': self.optimizer.state_dict(),
+    def _compute_loss(self, states, actions, rewards, next_states, dones, weights=None):
+        """Huber TD loss (importance-weighted when ``weights`` is given) and the
+        absolute TD errors."""
+        with self._autocast():
+            # Current Q values
+            current_q = self.model(states).gather(1, actions.unsqueeze(1)).squeeze(1).float()
+            
+            # Next Q values from target network
+            with torch.no_grad():
+                next_q = self.target_model(next_states).max(1)[0].float()
+        
+        target_q = rewards + (1 - dones) * self.gamma * next_q
+        if weights is None:
+            loss = self.loss_fn(current_q, target_q)
+        else:
+            loss = (weights * F.smooth_l1_loss(current_q, target_q, reduction='none')).mean()
+        return loss, (target_q - current_q).detach().abs()
+    
+    def _sample_batch(self):
+        with self.memory_lock:
+            if self.prioritized_replay:
+                return self.memory.sample(self.batch_size, self.per_beta)
+            return self.memory.sample(self.batch_size)
+    
+    def close(self):
+        """Stop the prefetch thread, if one was started."""
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+    
+    def checkpoint_state(self):
+        """Snapshot of everything ``save`` writes, copied to CPU so training can
+        continue while it is serialized elsewhere."""
+        return {
+            'model_state_dict': _cpu_copy(self.model.state_dict()),
+            'target_model_state_dict': _cpu_copy(self.target_model.state_dict()),
+            'optimizer_state_dict': _cpu_copy(self.optimizer.state_dict()),
             'epsilon': self.epsilon,
-            'steps': self.steps
-        }, path)
+            'steps': self.steps,
+            'env_steps': self.env_steps,
+            'per_beta': self.per_beta,
+            'architecture': self.architecture,
+            'width': self.width,
+            'height': self.height
+        }
+    
+    def save(self, path):
+        save_atomic(self.checkpoint_state(), path)
     
     def load(self, path):
-        checkpoint = torch.load(path, map_location=self.device)
+        self.load_checkpoint_state(torch.load(path, map_location=self.device))
+    
+    def load_checkpoint_state(self, checkpoint):
+        # Rebuild the networks if the checkpoint used another architecture
+        # or, for conv, another grid (checkpoints written before architectures
+        # existed are MLPs); a new state size also means a new, empty memory
+        architecture = checkpoint.get('architecture', 'mlp')
+        width = checkpoint.get('width', self.width)
+        height = checkpoint.get('height', self.height)
+        if architecture != self.architecture or (
+                architecture == 'conv' and (width, height) != (self.width, self.height)):
+            self.width, self.height = width, height
+            state_dim = network_state_dim(architecture, checkpoint['model_state_dict'], width, height)
+            if state_dim != self.state_dim:
+                self.close()
+                self.state_dim = state_dim
+                self._build_memory(self.memory.capacity)
+            self._build_networks(architecture)
         self.model.load_state_dict(checkpoint['model_state_dict'])
         self.target_model.load_state_dict(checkpoint['target_model_state_dict'])
         self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
         self.epsilon = checkpoint['epsilon']
         self.steps = checkpoint['steps']
+        self.env_steps = checkpoint.get('env_steps', 0)
+        self.per_beta = checkpoint.get('per_beta', self.per_beta)
         self.model.eval()
-        self.target_model.eval()
\ No newline at end of file
+        self.target_model.eval()
@@ -0,0 +1,131 @@
+from snake_env import SnakeGame
+import numpy as np
+import os
+import struct
+
+MAGIC = b'SNKL'
+VERSION = 1
+_RECORD = struct.Struct('<IHHI')
+
+class EpisodeLog:
+    """Seed, board size and per-step action pairs of one SnakeGame episode.
+
+    A SnakeGame seeded with ``seed`` right before ``reset()`` replays the
+    episode exactly from these actions, so a game is stored in half a byte per
+    step instead of its observations.
+    """
+    def __init__(self, seed, width=36, height=36, actions=None):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.actions = [] if actions is None else [tuple(pair) for pair in np.asarray(actions).tolist()]
+
+    def __len__(self):
+        return len(self.actions)
+
+    @classmethod
+    def start(cls, env, seed):
+        """Seed and reset ``env`` for a new logged episode; returns ``(log, state)``."""
+        env.seed(seed)
+        state = env.reset()
+        return cls(seed, env.width, env.height), state
+
+    def append(self, env, action1=None, action2=None):
+        """Log the actions about to be passed to ``env.step``.
+
+        Call before stepping; ``None`` (keep going) is stored as the snake's
+        current direction, which ``step`` treats the same way. Actions relative
+        to the heading (local observations) are stored as directions, so logs
+        always re-play on a default SnakeGame.
+        """
+        if env.done:
+            return
+        action1, action2 = env._absolute_actions(action1, action2)
+        if action1 is None:
+            action1 = env.direction1.value
+        if action2 is None:
+            action2 = env.direction2.value
+        self.actions.append((int(action1), int(action2)))
+
+    def step(self, env, action1=None, action2=None):
+        """``append`` then ``env.step`` in one call."""
+        self.append(env, action1, action2)
+        return env.step(action1, action2)
+
+    def pack(self):
+        """Header plus the actions at 2 bits each (four per byte)."""
+        flat = np.asarray(self.actions, dtype=np.uint8).reshape(-1)
+        flat = np.concatenate([flat, np.zeros(-len(flat) % 4, dtype=np.uint8)])
+        packed = flat[0::4] | (flat[1::4] << 2) | (flat[2::4] << 4) | (flat[3::4] << 6)
+        return _RECORD.pack(self.seed, self.width, self.height, len(self.actions)) + packed.tobytes()
+
+    @classmethod
+    def unpack(cls, data, offset=0):
+        """Inverse of ``pack``; returns ``(log, next_offset)``."""
+        seed, width, height, steps = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        size = (2 * steps + 3) // 4
+        packed = np.frombuffer(data, dtype=np.uint8, count=size, offset=offset)
+        flat = np.empty((size, 4), dtype=np.uint8)
+        for i in range(4):
+            flat[:, i] = (packed >> (2 * i)) & 3
+        actions = flat.reshape(-1)[:2 * steps].reshape(steps, 2)
+        return cls(seed, width, height, actions), offset + size
+
+    def simulate(self, copy_state=True, frames=False):
+        """Re-play the episode, yielding ``(state, rewards, done, winner)`` per
+        step like ``SnakeGame.step``.
+
+        With ``copy_state=False`` the state is a read-only view that the next
+        step overwrites, which is the fast path when only outcomes are needed.
+        With ``frames=True`` each item also carries the rendered (H, W, 3)
+        frame from a headless renderer (a copy).
+        """
+        env = SnakeGame(self.width, self.height, copy_state=copy_state, headless=frames)
+        env.seed(self.seed)
+        env.reset()
+        try:
+            for action1, action2 in self.actions:
+                result = env.step(action1, action2)
+                if frames:
+                    env.render()
+                    pixels = env.frame()
+                    result = result + (pixels.copy(),)
+                    del pixels
+                yield result
+        finally:
+            env.close()
+
+    def outcome(self):
+        """Final ``(winner, score1, score2, steps)`` of the re-played episode."""
+        env = SnakeGame(self.width, self.height, copy_state=False)
+        env.seed(self.seed)
+        env.reset()
+        for action1, action2 in self.actions:
+            env.step(action1, action2)
+        return env.winner, env.score1, env.score2, env.steps
+
+def write_logs(path, logs, append=True):
+    """Write episode logs to an archive file (appending by default)."""
+    new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'wb' if not append else 'ab') as f:
+        if new_file:
+            f.write(MAGIC + struct.pack('<H', VERSION))
+        for log in logs:
+            f.write(log.pack())
+
+def read_logs(path):
+    """All episode logs stored in an archive file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f"{path} is not an episode log archive")
+    version, = struct.unpack_from('<H', data, 4)
+    if version != VERSION:
+        raise ValueError(f"Unsupported episode log version {version}")
+    logs = []
+    offset = 6
+    while offset < len(data):
+        log, offset = EpisodeLog.unpack(data, offset)
+        logs.append(log)
+    return logs
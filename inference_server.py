@@ -0,0 +1,349 @@
+from dqn_agent import build_network, configure_threads, network_state_dim
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import numpy as np
+import torch
+import argparse
+import asyncio
+import json
+import os
+import socket
+import stat
+import struct
+import time
+
+# Frames in both directions: kind (uint8), payload length (uint32), payload
+HEADER = struct.Struct('<BI')
+ACT = 1      # float32 states (one or more rows) -> int32 actions
+STATS = 2    # empty -> JSON stats
+RELOAD = 3   # checkpoint path (empty = the current one) -> JSON {'version'} or {'error'}
+ERROR = 255  # UTF-8 message; the session stays open
+MAX_PAYLOAD = 64 << 20
+
+def load_policy(path, state_dim=None, device=None):
+    """Greedy Q-network from a ``DQNAgent.save`` checkpoint, with its state size.
+
+    Conv checkpoints carry the board size they were trained on. ``state_dim``,
+    when given, must match the checkpoint.
+    """
+    checkpoint = torch.load(path, map_location=device)
+    weights = checkpoint['model_state_dict']
+    architecture = checkpoint.get('architecture', 'mlp')
+    width, height = checkpoint.get('width'), checkpoint.get('height')
+    if architecture == 'conv' and (width is None or height is None):
+        raise ValueError(f"{path} does not record its board size")
+    checkpoint_dim = network_state_dim(architecture, weights, width, height)
+    if state_dim is not None and state_dim != checkpoint_dim:
+        raise ValueError(f"{path} takes states of {checkpoint_dim} values, not {state_dim}")
+    action_dim = next(reversed(weights.values())).shape[0]
+    model = build_network(architecture, checkpoint_dim, action_dim, width, height).to(device)
+    model.load_state_dict(weights)
+    model.eval()
+    return model, checkpoint_dim
+
+class InferenceServer:
+    """One copy of a DQN serving actions to many games over a Unix socket.
+
+    Every session (connection) sends ACT frames with one state, or a block of
+    states for a vectorized game, and waits for the actions. Requests from all
+    sessions are queued and run as one forward pass once ``max_batch_size``
+    rows are waiting, every connected session has a request in, or the oldest
+    request has waited ``max_latency_ms``.
+    Forward passes run on a worker thread, so the next batch fills up while
+    one is computed.
+
+    ``reload`` (or a RELOAD frame, or ``watch_interval`` polling the
+    checkpoint's modification time) loads new weights next to the running
+    ones and swaps them in between batches; sessions stay connected and
+    requests keep their place in the queue. A checkpoint that fails to load
+    or does not fit the served state and action sizes leaves the old weights
+    in place.
+
+    ``stats`` reports sessions, queue depth, batch sizes and p50/p99 latency
+    (queueing plus forward) over the most recent ``window`` requests.
+    """
+    def __init__(self, checkpoint, path, state_dim=None, max_batch_size=256, max_latency_ms=2.0,
+                 device=None, watch_interval=None, report_interval=None, window=10000):
+        self.checkpoint = checkpoint
+        self.path = path
+        self.device = device or torch.device("cpu")
+        self.model, self.state_dim = load_policy(checkpoint, state_dim, self.device)
+        self.action_dim = next(reversed(list(self.model.parameters()))).shape[0]
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.watch_interval = watch_interval
+        self.report_interval = report_interval
+        self.version = 0
+        self._mtime = os.stat(checkpoint).st_mtime_ns
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        self.sessions = 0
+        self.requests = 0
+        self.batches = 0
+        self.peak_queue_depth = 0
+        self._latencies = deque(maxlen=window)
+        self._batch_sizes = deque(maxlen=window)
+        self._queue = None
+
+    # Serving
+
+    def run(self):
+        """Serve until interrupted."""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, ready=None):
+        """Serve on ``self.path``; ``ready`` (an Event) is set once listening."""
+        self._queue = asyncio.Queue()
+        if os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode):
+            os.unlink(self.path)  # left behind by a previous server
+        server = await asyncio.start_unix_server(self._session, path=self.path)
+        tasks = [asyncio.create_task(self._batch_loop())]
+        if self.watch_interval:
+            tasks.append(asyncio.create_task(self._watch()))
+        if self.report_interval:
+            tasks.append(asyncio.create_task(self._report()))
+        print(f"Serving {self.checkpoint} on {self.path}")
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._executor.shutdown(wait=False)
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _session(self, reader, writer):
+        self.sessions += 1
+        try:
+            while True:
+                kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                if length > MAX_PAYLOAD:
+                    break
+                payload = await reader.readexactly(length)
+                if kind == ACT:
+                    states = np.frombuffer(payload, dtype=np.float32)
+                    if len(states) == 0 or len(states) % self.state_dim:
+                        reply = (ERROR, f"expected rows of {self.state_dim} float32 values, "
+                                        f"got {len(states)}".encode())
+                    else:
+                        actions = await self.submit(states.reshape(-1, self.state_dim))
+                        reply = (ACT, actions.astype(np.int32).tobytes())
+                elif kind == STATS:
+                    reply = (STATS, json.dumps(self.stats()).encode())
+                elif kind == RELOAD:
+                    try:
+                        result = {'version': await self.reload(payload.decode() or None)}
+                    except Exception as e:
+                        result = {'error': str(e)}
+                    reply = (RELOAD, json.dumps(result).encode())
+                else:
+                    reply = (ERROR, f"unknown frame kind {kind}".encode())
+                writer.write(HEADER.pack(reply[0], len(reply[1])) + reply[1])
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    async def submit(self, states):
+        """Queue a (rows, state_dim) float32 block and wait for its actions."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((states, future, time.perf_counter()))
+        self.peak_queue_depth = max(self.peak_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            rows = len(items[0][0])
+            deadline = items[0][2] + self.max_latency
+
+            # Take whatever is waiting, then wait for more until the batch is
+            # full, the oldest request's deadline passes or every session is
+            # already in (each session has at most one request out)
+            while rows < self.max_batch_size:
+                if self._queue.empty():
+                    if len(items) >= self.sessions:
+                        break
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                items.append(item)
+                rows += len(item[0])
+
+            states = np.concatenate([item[0] for item in items])
+            try:
+                actions = await loop.run_in_executor(self._executor, self._forward, self.model, states)
+            except Exception as e:
+                for _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            now = time.perf_counter()
+            start = 0
+            for item_states, future, queued in items:
+                end = start + len(item_states)
+                if not future.done():
+                    future.set_result(actions[start:end])
+                self._latencies.append(now - queued)
+                start = end
+            self.requests += len(items)
+            self.batches += 1
+            self._batch_sizes.append(rows)
+
+    def _forward(self, model, states):
+        with torch.no_grad():
+            q_values = model(torch.from_numpy(states).to(self.device))
+        return torch.argmax(q_values, dim=1).cpu().numpy()
+
+    # Weights
+
+    async def reload(self, checkpoint=None):
+        """Swap in the weights of ``checkpoint`` (default: the served one).
+        Returns the new weights version."""
+        checkpoint = checkpoint or self.checkpoint
+        loop = asyncio.get_running_loop()
+        mtime = os.stat(checkpoint).st_mtime_ns
+        model, _ = await loop.run_in_executor(None, load_policy, checkpoint, self.state_dim, self.device)
+        if next(reversed(list(model.parameters()))).shape[0] != self.action_dim:
+            raise ValueError(f"{checkpoint} does not have {self.action_dim} actions")
+
+        # Batches already handed to the worker finish on the old weights
+        self.model = model
+        self.checkpoint = checkpoint
+        self._mtime = mtime
+        self.version += 1
+        print(f"Loaded {checkpoint} (weights version {self.version})")
+        return self.version
+
+    async def _watch(self):
+        """Reload whenever the checkpoint file is replaced (``save_atomic``
+        renames finished files into place, so a change is always complete)."""
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            try:
+                mtime = os.stat(self.checkpoint).st_mtime_ns
+                if mtime != self._mtime:
+                    self._mtime = mtime
+                    await self.reload()
+            except Exception as e:
+                print(f"Reload of {self.checkpoint} failed, keeping version {self.version}: {e}")
+
+    # Reporting
+
+    def stats(self):
+        latencies = np.array(self._latencies) * 1000
+        batch_sizes = np.array(self._batch_sizes)
+        return {
+            'sessions': self.sessions,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'peak_queue_depth': self.peak_queue_depth,
+            'requests': self.requests,
+            'batches': self.batches,
+            'batch_size_mean': float(batch_sizes.mean()) if len(batch_sizes) else 0.0,
+            'batch_size_max': int(batch_sizes.max()) if len(batch_sizes) else 0,
+            'latency_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+            'latency_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+            'weights_version': self.version,
+            'checkpoint': self.checkpoint,
+        }
+
+    async def _report(self):
+        last_requests, last_time = self.requests, time.perf_counter()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            stats = self.stats()
+            now = time.perf_counter()
+            rate = (stats['requests'] - last_requests) / (now - last_time)
+            last_requests, last_time = stats['requests'], now
+            print(f"Sessions: {stats['sessions']}, queue depth: {stats['queue_depth']} "
+                  f"(peak {stats['peak_queue_depth']}), batch size: {stats['batch_size_mean']:.1f} "
+                  f"(max {stats['batch_size_max']}), latency p50/p99: {stats['latency_p50_ms']:.2f}/"
+                  f"{stats['latency_p99_ms']:.2f} ms, requests/s: {rate:.0f}, "
+                  f"weights v{stats['weights_version']}")
+
+class InferenceClient:
+    """Blocking connection to an InferenceServer, one per game (session)."""
+    def __init__(self, path, timeout=None):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+
+    def _request(self, kind, payload=b''):
+        self.sock.sendall(HEADER.pack(kind, len(payload)) + payload)
+        reply_kind, length = HEADER.unpack(self._recv(HEADER.size))
+        reply = self._recv(length)
+        if reply_kind == ERROR:
+            raise ValueError(reply.decode())
+        return reply
+
+    def _recv(self, n):
+        data = bytearray()
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("inference server closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def act(self, state):
+        """Greedy action for one state."""
+        return int(self.act_batch(np.asarray(state)[None])[0])
+
+    def act_batch(self, states):
+        """Greedy actions for an (N, state_dim) batch, e.g. a VecSnakeGame's states."""
+        states = np.ascontiguousarray(states, dtype=np.float32)
+        return np.frombuffer(self._request(ACT, states.tobytes()), dtype=np.int32).astype(np.int64)
+
+    def stats(self):
+        return json.loads(self._request(STATS))
+
+    def reload(self, checkpoint=None):
+        """Ask the server to swap in new weights; returns the new version."""
+        result = json.loads(self._request(RELOAD, (checkpoint or '').encode()))
+        if 'error' in result:
+            raise ValueError(result['error'])
+        return result['version']
+
+    def close(self):
+        self.sock.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a trained DQN to many games over a Unix socket")
+    parser.add_argument("checkpoint", help="model checkpoint (DQNAgent.save) to serve")
+    parser.add_argument("--socket", default="/tmp/snake_dqn.sock", help="Unix socket path")
+    parser.add_argument("--state-dim", type=int, default=None,
+                        help="expected state size (checked against the checkpoint)")
+    parser.add_argument("--max-batch-size", type=int, default=256,
+                        help="run a forward pass once this many rows are waiting")
+    parser.add_argument("--max-latency-ms", type=float, default=2.0,
+                        help="longest a request waits for its batch to fill")
+    parser.add_argument("--watch", type=float, default=None,
+                        help="reload the checkpoint when it changes, checking every this many seconds")
+    parser.add_argument("--report-every", type=float, default=10.0,
+                        help="seconds between stats lines (0 = quiet)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="PyTorch intra-op threads")
+    args = parser.parse_args()
+
+    configure_threads(args.threads)
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    InferenceServer(args.checkpoint, args.socket, state_dim=args.state_dim,
+                    max_batch_size=args.max_batch_size, max_latency_ms=args.max_latency_ms,
+                    device=device, watch_interval=args.watch,
+                    report_interval=args.report_every or None).run()
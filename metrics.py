@@ -0,0 +1,64 @@
+import numpy as np
+import json
+import os
+import time
+
+class MetricsWriter:
+    """Append-only binary log of fixed-size float64 records.
+
+    Rows are buffered in a preallocated chunk and appended to ``path`` when the
+    chunk fills or ``flush_interval`` seconds have passed, so memory use stays
+    bounded however long the run is. The column names are stored next to the
+    data in ``path + '.json'``, and ``read_metrics`` can map the file while the
+    run is still writing it.
+    """
+    def __init__(self, path, fields, chunk_size=256, flush_interval=10.0, keep_rows=0):
+        self.path = path
+        self.fields = tuple(fields)
+        self.dtype = np.dtype([(field, np.float64) for field in self.fields])
+        self.chunk = np.zeros(chunk_size, dtype=self.dtype)
+        self.pending = 0
+        self.flush_interval = flush_interval
+        self.last_flush = time.time()
+
+        with open(path + '.json', 'w') as f:
+            json.dump({'fields': self.fields}, f)
+
+        # Keep the first keep_rows rows (e.g. those covered by a checkpoint
+        # being resumed) and drop anything written after them
+        self.file = open(path, 'ab')
+        existing = os.path.getsize(path) // self.dtype.itemsize
+        self.rows = min(keep_rows, existing)
+        self.file.truncate(self.rows * self.dtype.itemsize)
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, **values):
+        """Add one row; columns not given are stored as NaN."""
+        row = self.chunk[self.pending]
+        for field in self.fields:
+            row[field] = values.get(field, np.nan)
+        self.pending += 1
+        self.rows += 1
+        if self.pending == len(self.chunk) or time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.file.write(self.chunk[:self.pending].tobytes())
+            self.pending = 0
+        self.file.flush()
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+def read_metrics(path):
+    """Map a metrics log as a structured array (complete rows only)."""
+    with open(path + '.json') as f:
+        fields = json.load(f)['fields']
+    dtype = np.dtype([(field, np.float64) for field in fields])
+    rows = os.path.getsize(path) // dtype.itemsize
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
@@ -0,0 +1,296 @@
+from collections import deque
+from heapq import heappop, heappush
+import numpy as np
+
+# Candidate moves relative to the heading: ahead, right, left (ties go to the first)
+_TURNS = (0, 1, 3)
+
+def _neighbor_table(width, height):
+    """Flat neighbour cells of every cell on the wrapping board, shape
+    (cells, 4), indexed by Direction value (up, right, down, left)."""
+    cells = np.arange(width * height)
+    x, y = cells % width, cells // width
+    return np.stack([((y - 1) % height) * width + x,
+                     y * width + (x + 1) % width,
+                     ((y + 1) % height) * width + x,
+                     y * width + (x - 1) % width], axis=1)
+
+def _manhattan(width, height, food):
+    """Wrapped Manhattan distance of every cell to the flat cells in ``food``,
+    shape (len(food), height, width): the BFS field of an empty board."""
+    x, y = np.arange(width), np.arange(height)
+    dx = np.abs(x - (food % width)[:, None])
+    dy = np.abs(y - (food // width)[:, None])
+    dx = np.minimum(dx, width - dx)
+    dy = np.minimum(dy, height - dy)
+    return (dy[:, :, None] + dx[:, None, :]).astype(np.int32)
+
+def _repair_batch(dist, blocked, changed, neighbors, num_cells, inf):
+    """``BFSPlanner._repair`` for many boards at once.
+
+    ``dist`` and ``blocked`` are the flattened (games * cells) fields and
+    ``changed`` the flat indices of cells that got blocked or freed. Each
+    round of the cascade and of the relaxation handles one frontier of cells
+    across all games, so the work follows the cells that actually change.
+    """
+    def around(cells):
+        return (cells // num_cells * num_cells)[:, None] + neighbors[cells % num_cells]
+
+    # Drop newly blocked cells and, frontier by frontier, every cell left
+    # without a neighbour one step closer to the food
+    cut = changed[blocked[changed] & (dist[changed] < inf)]
+    level = dist[cut]
+    dist[cut] = inf
+    touched = [changed]
+    while len(cut):
+        children = around(cut)
+        children = np.unique(children[dist[children] == (level + 1)[:, None]])
+        level = dist[children]
+        lost = ~(dist[around(children)] == (level - 1)[:, None]).any(axis=1)
+        cut, level = children[lost], level[lost]
+        dist[cut] = inf
+        touched.append(cut)
+
+    # Re-seed those cells and the freed ones from their neighbours, then
+    # relax outward until no distance drops
+    seeds = np.unique(np.concatenate(touched))
+    seeds = seeds[~blocked[seeds]]
+    best = dist[around(seeds)].min(axis=1) + 1
+    better = best < dist[seeds]
+    frontier = seeds[better]
+    dist[frontier] = best[better]
+    while len(frontier):
+        targets = around(frontier).ravel()
+        values = np.repeat(dist[frontier] + 1, 4)
+        ok = (values < dist[targets]) & ~blocked[targets]
+        targets = targets[ok]
+        np.minimum.at(dist, targets, values[ok])
+        frontier = np.unique(targets)
+
+def _room(blocked, start, limit, neighbors):
+    """Free cells reachable from ``start``, counting up to ``limit``."""
+    seen = {start}
+    queue = deque([start])
+    while queue and len(seen) < limit:
+        for v in neighbors[queue.popleft()]:
+            if v not in seen and not blocked[v]:
+                seen.add(v)
+                queue.append(v)
+    return len(seen)
+
+def _fallback(blocked, candidates, directions, safe, contested, length, neighbors):
+    """Move when no candidate leads to food: the safe cell with the most room
+    (counted up to twice the snake's length), uncontested cells first;
+    straight ahead when every move is fatal."""
+    best, best_key = directions[0], None
+    for cell, direction, ok, risky in zip(candidates, directions, safe, contested):
+        if not ok:
+            continue
+        key = (not risky, _room(blocked, cell, 2 * length + 2, neighbors))
+        if best_key is None or key > best_key:
+            best, best_key = direction, key
+    return best
+
+class BFSPlanner:
+    """Scripted player for one snake of a SnakeGame.
+
+    Keeps a BFS distance field from the food over the free cells of the
+    wrapping board and moves to the neighbouring cell closest to the food.
+    Cells the opponent's head can reach next are avoided while another way
+    exists, and cells cut off from the food are only entered when nothing
+    else is left, then the one with the most room.
+
+    Between ticks only a few cells change (heads in, tails out), so the
+    field is repaired around them rather than recomputed. When the food
+    moves, the empty-board (wrapped Manhattan) distances are repaired around
+    every obstacle instead of running a full BFS.
+
+    ``act`` returns a Direction value for ``snake_num``, e.g.
+    ``env.step(planner.act(env), action)``. With ``observation='local'`` a
+    learner's actions are relative to its heading, so convert the planner's
+    move before using it for a learner's snake there.
+    """
+    def __init__(self, snake_num=1):
+        self.snake_num = snake_num
+        self.width = self.height = None
+
+    def _setup(self, width, height):
+        self.width = width
+        self.height = height
+        self.num_cells = width * height
+        self.inf = self.num_cells
+        self.neighbors = [tuple(row) for row in _neighbor_table(width, height).tolist()]
+        self.blocked = np.ones(self.num_cells, dtype=bool)
+        self.free = [False] * self.num_cells
+        self.dist = [self.inf] * self.num_cells
+        self.food = None
+
+    def act(self, env):
+        if env.width != self.width or env.height != self.height:
+            self._setup(env.width, env.height)
+        self._sync(env)
+
+        if self.snake_num == 1:
+            snake, other, heading = env.snake1, env.snake2, env.direction1.value
+        else:
+            snake, other, heading = env.snake2, env.snake1, env.direction2.value
+        head = snake[0][1] * self.width + snake[0][0]
+        opponent = other[0][1] * self.width + other[0][0]
+
+        dist, blocked, neighbors = self.dist, self.blocked, self.neighbors
+        reach = neighbors[opponent]
+        directions = [(heading + turn) % 4 for turn in _TURNS]
+        candidates = [neighbors[head][d] for d in directions]
+        safe = [not blocked[c] for c in candidates]
+        contested = [c in reach for c in candidates]
+
+        best, best_key = None, None
+        for direction, cell, ok, risky in zip(directions, candidates, safe, contested):
+            if ok and dist[cell] < self.inf:
+                key = (risky, dist[cell])
+                if best_key is None or key < best_key:
+                    best, best_key = direction, key
+        if best is None:
+            best = _fallback(blocked, candidates, directions, safe, contested, len(snake), neighbors)
+        return best
+
+    def _sync(self, env):
+        """Bring the distance field up to date with the board."""
+        blocked = env.occupancy.reshape(-1) != 0
+        food = None if env.food is None else env.food[1] * self.width + env.food[0]
+        changed = np.flatnonzero(blocked != self.blocked).tolist()
+        self.blocked = blocked
+        free = self.free
+        for cell in changed:
+            free[cell] = not blocked[cell]
+
+        if food != self.food:
+            self.food = food
+            self._rebuild()
+        elif changed:
+            self._repair(changed)
+
+    def _rebuild(self):
+        """Empty-board distances, repaired as if every obstacle just appeared."""
+        if self.food is None:
+            self.dist = [self.inf] * self.num_cells
+            return
+        self.dist = _manhattan(self.width, self.height, np.array([self.food])).reshape(-1).tolist()
+        self._repair(np.flatnonzero(self.blocked).tolist())
+
+    def _repair(self, changed):
+        """Incremental BFS update after cells got blocked or freed.
+
+        Newly blocked cells drop their distance, and so does every cell left
+        without a neighbour one step closer to the food (cascading outward).
+        Those cells and the freed ones are re-seeded from their neighbours and
+        distances relaxed from there, Dijkstra-style.
+        """
+        dist, free, neighbors, inf = self.dist, self.free, self.neighbors, self.inf
+        stack = []
+        touched = []
+        for cell in changed:
+            touched.append(cell)
+            if not free[cell] and dist[cell] < inf:
+                stack.append((dist[cell], cell))
+                dist[cell] = inf
+
+        # A cell is re-checked each time one of its closer neighbours is
+        # dropped, so the order of this cascade does not matter
+        while stack:
+            d, u = stack.pop()
+            for v in neighbors[u]:
+                if dist[v] == d + 1:
+                    a, b, c, e = neighbors[v]
+                    if dist[a] != d and dist[b] != d and dist[c] != d and dist[e] != d:
+                        dist[v] = inf
+                        stack.append((d + 1, v))
+                        touched.append(v)
+
+        heap = []
+        for v in touched:
+            if free[v]:
+                if v == self.food:
+                    d = 0
+                else:
+                    a, b, c, e = neighbors[v]
+                    d = min(dist[a], dist[b], dist[c], dist[e]) + 1
+                if d < dist[v]:
+                    dist[v] = d
+                    heappush(heap, (d, v))
+        while heap:
+            d, u = heappop(heap)
+            if d > dist[u]:
+                continue
+            d += 1
+            for v in neighbors[u]:
+                if d < dist[v] and free[v]:
+                    dist[v] = d
+                    heappush(heap, (d, v))
+
+class VecBFSPlanner:
+    """``BFSPlanner`` for one snake (0 or 1) in every game of a VecSnakeGame.
+
+    The distance fields of all games live in one (num_envs, cells) array and
+    ``_repair_batch`` updates them together from the cells that changed in
+    each game since the last call. The fields are exact, so decisions match
+    ``BFSPlanner`` move for move.
+    """
+    def __init__(self, snake=0):
+        self.snake = snake
+        self.shape = None
+
+    def _setup(self, num_envs, width, height):
+        self.shape = (num_envs, width, height)
+        self.width = width
+        self.height = height
+        self.num_cells = width * height
+        self.inf = self.num_cells
+        self.neighbor_table = _neighbor_table(width, height)
+        self.neighbors = [tuple(row) for row in self.neighbor_table.tolist()]
+        self.blocked = np.ones((num_envs, self.num_cells), dtype=bool)
+        self.dist = np.full((num_envs, self.num_cells), self.inf, dtype=np.int64)
+        self.food = np.full(num_envs, -2, dtype=np.int64)
+
+    def act(self, env):
+        if self.shape != (env.num_envs, env.width, env.height):
+            self._setup(env.num_envs, env.width, env.height)
+        self._sync(env)
+
+        n = env.num_envs
+        rows = np.arange(n)[:, None]
+        heads = env._heads(env._all, self.snake)
+        opponents = env._heads(env._all, 1 - self.snake)
+        directions = (env.directions[:, self.snake, None] + np.array(_TURNS)) % 4
+        candidates = self.neighbor_table[heads[:, None], directions]
+        safe = ~self.blocked[rows, candidates]
+        reach = self.neighbor_table[opponents]
+        contested = (candidates[:, :, None] == reach[:, None, :]).any(axis=2)
+        dist = self.dist[rows, candidates]
+
+        usable = safe & (dist < self.inf)
+        key = np.where(usable, contested * (self.inf + 1) + dist, 3 * self.inf)
+        actions = np.take_along_axis(directions, key.argmin(axis=1)[:, None], axis=1)[:, 0]
+        for i in np.flatnonzero(~usable.any(axis=1)):
+            actions[i] = _fallback(self.blocked[i], candidates[i].tolist(), directions[i].tolist(),
+                                   safe[i], contested[i], int(env.lengths[i, self.snake]),
+                                   self.neighbors)
+        return actions
+
+    def _sync(self, env):
+        blocked = env.occupancy.any(axis=1)
+        changed = blocked != self.blocked
+
+        # Games whose food moved restart from the empty-board distances with
+        # every obstacle counted as new (no food: nothing is reachable)
+        moved = np.flatnonzero(env.food != self.food)
+        if len(moved):
+            food = env.food[moved]
+            self.dist[moved] = _manhattan(self.width, self.height, np.maximum(food, 0)).reshape(len(moved), -1)
+            self.dist[moved[food < 0]] = self.inf
+            changed[moved] = blocked[moved]
+
+        self.blocked = blocked
+        self.food = env.food.copy()
+        _repair_batch(self.dist.reshape(-1), blocked.reshape(-1), np.flatnonzero(changed),
+                      self.neighbor_table, self.num_cells, self.inf)
@@ -1,28 +1,44 @@
 from snake_env import SnakeGame
 from dqn_agent import DQNAgent
+from episode_log import EpisodeLog, write_logs
+from planner import BFSPlanner
+from inference_server import InferenceClient
 import pygame
 import numpy as np
+import argparse
+import random
 import sys
 import torch
 
-def main():
+def main(record_path=None, observation='grid', view_size=11, board_size=36, planner=False,
+         server=None):
     # Setup device
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     
     # Initialize environment and agent
-    env = SnakeGame(width=36, height=36, gui=True)
+    env = SnakeGame(width=board_size, height=board_size, gui=True, observation=observation,
+                    view_size=view_size)
     state_dim = len(env._get_state())
     action_dim = 4
     
-    # Load trained agent (you'll need to update this path)
-    agent = DQNAgent(state_dim, action_dim, device)
-    try:
-        agent.load("models/snake_dqn_final.pth")  # Update with your model path
-        agent.epsilon = 0.01  # Minimal exploration during play
-        print("AI model loaded successfully!")
-    except:
-        print("No trained model found. AI will play randomly.")
-        agent = None
+    # Load trained agent (you'll need to update this path), or let the planner
+    # or a shared inference server play
+    agent = None
+    planner = BFSPlanner(snake_num=2) if planner else None
+    client = InferenceClient(server) if server else None
+    if planner:
+        print("AI is the scripted BFS planner.")
+    elif client:
+        print(f"AI actions come from the inference server at {server}.")
+    else:
+        agent = DQNAgent(state_dim, action_dim, device)
+        try:
+            agent.load("models/snake_dqn_final.pth")  # Update with your model path
+            agent.epsilon = 0.01  # Minimal exploration during play
+            print("AI model loaded successfully!")
+        except:
+            print("No trained model found. AI will play randomly.")
+            agent = None
     
     clock = pygame.time.Clock()
     human_wins = 0
@@ -37,7 +53,8 @@ def main():
     print("Human (Green) vs AI (Magenta)")
     
     while True:
-        state = env.reset()
+        # Every game gets its own seed so it can be replayed from its action log
+        log, state = EpisodeLog.start(env, random.getrandbits(32))
         done = False
         
         while not done:
@@ -65,7 +82,7 @@ def main():
                             draws += 1
                         
                         print(f"Stats - Human: {human_wins}, AI: {ai_wins}, Draws: {draws}")
-                        state = env.reset()
+                        log, state = EpisodeLog.start(env, random.getrandbits(32))
                         done = False
                         action1 = None
                     elif event.key == pygame.K_ESCAPE:
@@ -73,14 +90,21 @@ def main():
                         sys.exit()
             
             # Get AI action
-            if agent:
+            if planner:
+                action2 = planner.act(env)
+                if observation == 'local':
+                    # Local-view actions are relative to the AI's heading
+                    action2 = (action2 - env.direction2.value) % 4
+            elif client:
+                action2 = client.act(state)
+            elif agent:
                 action2 = agent.act(state, evaluation=True)
             else:
                 # Random AI if no model loaded
                 action2 = np.random.randint(0, 4)
             
             # Take step
-            state, (_, _), done, winner = env.step(action1, action2)
+            state, (_, _), done, winner = log.step(env, action1, action2)
             action1 = None  # Reset human action
             
             # Render the game
@@ -88,6 +112,10 @@ def main():
             
             clock.tick(12)  # Slightly faster for better gameplay feel
         
+        # Archive the finished game (seed + 2-bit actions, a few hundred bytes)
+        if record_path:
+            write_logs(record_path, [log])
+        
         # Wait for restart after game over
         waiting = True
         while waiting and env.done:
@@ -116,4 +144,19 @@ def main():
             clock.tick(60)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Play against the trained AI")
+    parser.add_argument("--record", default=None,
+                        help="append every finished game's action log to this file")
+    parser.add_argument("--observation", choices=["grid", "local"], default="grid",
+                        help="observation mode the model was trained with")
+    parser.add_argument("--view-size", type=int, default=11,
+                        help="local view size the model was trained with")
+    parser.add_argument("--board-size", type=int, default=36,
+                        help="board side in cells (grid models only run on the size they were trained on)")
+    parser.add_argument("--planner", action="store_true",
+                        help="play against the scripted BFS planner instead of the model")
+    parser.add_argument("--server", default=None,
+                        help="Unix socket of a running inference_server.py to get the AI's actions from")
+    args = parser.parse_args()
+    main(record_path=args.record, observation=args.observation, view_size=args.view_size,
+         board_size=args.board_size, planner=args.planner, server=args.server)
@@ -0,0 +1,222 @@
+import numpy as np
+from collections import defaultdict, deque
+import cProfile
+import csv
+import functools
+import json
+import os
+import threading
+import time
+
+class _Timer:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class Profiler:
+    """Named wall-clock timers and counters for the training hot paths.
+
+    Disabled by default: ``timer()`` then hands back a shared no-op context
+    manager and ``count()`` returns straight away, so the instrumented code
+    pays one ``recording()`` check per call. Once enabled, the last ``window``
+    durations of every timer are kept for percentiles alongside running
+    totals. Timers may nest (``env.step`` contains ``env.get_state``), so
+    shares of wall time can add up to more than 100%.
+
+    CUDA work is asynchronous; GPU phases are only attributed correctly when
+    the device is synchronized inside the timed region.
+
+    Timers and counters may be hit from several threads; a thread doing work
+    that is not part of the training loop (the async evaluator) calls
+    ``mute_thread()`` so its time stays out of the breakdown.
+    """
+    def __init__(self, window=1000):
+        self.enabled = False
+        self.window = window
+        self.hook = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.durations = defaultdict(lambda: deque(maxlen=self.window))
+        self.totals = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.steps = 0
+        self.started = time.perf_counter()
+
+    def enable(self, window=None):
+        if window is not None:
+            self.window = window
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self._stop_hook()
+
+    def mute_thread(self):
+        """Stop recording timers and counters from the calling thread."""
+        self._local.muted = True
+
+    def recording(self):
+        """Whether the calling thread's timers and counters are kept."""
+        return self.enabled and not getattr(self._local, 'muted', False)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.durations[name].append(seconds)
+            self.totals[name] += seconds
+            self.calls[name] += 1
+
+    def timer(self, name):
+        """Context manager timing the enclosed block under ``name``."""
+        if not self.recording():
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def count(self, name, n=1):
+        if self.recording():
+            with self._lock:
+                self.counters[name] += n
+
+    def step(self):
+        """Mark the end of one training iteration (drives ``profile_steps``)."""
+        if not self.enabled:
+            return
+        self.steps += 1
+        if self.hook is not None:
+            kind, profile, last_step, path = self.hook
+            if kind == 'torch':
+                profile.step()
+            if self.steps >= last_step:
+                self._stop_hook()
+
+    def profile_steps(self, num_steps, kind='cprofile', path=None):
+        """Run cProfile or the torch profiler for the next ``num_steps`` calls
+        to ``step()`` and write its output to ``path`` when done.
+
+        cProfile writes a ``pstats`` file; the torch profiler writes a Chrome
+        trace (open it in chrome://tracing or Perfetto).
+        """
+        self._stop_hook()
+        if kind == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+        elif kind == 'torch':
+            import torch
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            profile = torch.profiler.profile(activities=activities, record_shapes=True)
+            profile.start()
+        else:
+            raise ValueError(f"Unknown profiler hook {kind!r}, expected 'cprofile' or 'torch'")
+        if path is None:
+            path = "profile.pstats" if kind == 'cprofile' else "profile_trace.json"
+        self.hook = (kind, profile, self.steps + num_steps, path)
+
+    def _stop_hook(self):
+        if self.hook is None:
+            return
+        kind, profile, _, path = self.hook
+        self.hook = None
+        if kind == 'cprofile':
+            profile.disable()
+            profile.dump_stats(path)
+        else:
+            profile.stop()
+            profile.export_chrome_trace(path)
+        print(f"{kind} output written to {path}")
+
+    def summary(self):
+        """Per-timer statistics over the window plus totals since ``enable()``."""
+        wall = time.perf_counter() - self.started
+        timers = {}
+        for name, durations in sorted(self.durations.items()):
+            window = np.fromiter(durations, dtype=np.float64, count=len(durations)) * 1e6
+            p50, p90, p99 = np.percentile(window, [50, 90, 99])
+            timers[name] = {
+                'calls': self.calls[name],
+                'total_s': self.totals[name],
+                'share': self.totals[name] / wall if wall > 0 else 0.0,
+                'mean_us': float(window.mean()),
+                'p50_us': float(p50),
+                'p90_us': float(p90),
+                'p99_us': float(p99),
+                'max_us': float(window.max()),
+            }
+        return {
+            'wall_time_s': wall,
+            'steps': self.steps,
+            'window': self.window,
+            'timers': timers,
+            'counters': dict(self.counters),
+        }
+
+    def export(self, path):
+        """Write ``summary()`` as JSON, or one row per timer when ``path`` ends in .csv."""
+        summary = self.summary()
+        if os.path.splitext(path)[1].lower() == '.csv':
+            columns = ['calls', 'total_s', 'share', 'mean_us', 'p50_us', 'p90_us', 'p99_us', 'max_us']
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['name'] + columns)
+                for name, stats in summary['timers'].items():
+                    writer.writerow([name] + [stats[column] for column in columns])
+                for name, value in summary['counters'].items():
+                    writer.writerow([name, value] + [''] * (len(columns) - 1))
+        else:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+    def format(self):
+        """Short text table of the timers, largest total first."""
+        summary = self.summary()
+        lines = [f"Profile over {summary['wall_time_s']:.1f}s, {summary['steps']} steps"]
+        for name, stats in sorted(summary['timers'].items(), key=lambda item: -item[1]['total_s']):
+            lines.append(f"  {name:24s} {stats['share']:6.1%}  {stats['calls']:9d} calls  "
+                         f"p50 {stats['p50_us']:9.1f}us  p99 {stats['p99_us']:9.1f}us")
+        for name, value in sorted(summary['counters'].items()):
+            lines.append(f"  {name:24s} {value}")
+        return "\n".join(lines)
+
+# Process-wide instance used by the instrumented modules
+PROFILER = Profiler()
+
+def timed(name):
+    """Decorator timing every call of the wrapped function under ``name``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.recording():
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                PROFILER.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
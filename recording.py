@@ -0,0 +1,155 @@
+from snake_env import SnakeGame
+from planner import BFSPlanner
+import numpy as np
+import argparse
+import os
+import struct
+import zlib
+
+MAGIC = b'SNKV'
+VERSION = 2
+
+class FrameRecorder:
+    """Writes the frames of a headless SnakeGame to a compact delta stream.
+
+    Only the scene under the scrolling scanlines is stored: the rectangles
+    where it changed, each as a zlib-compressed RGB patch, plus the scanline
+    phase, so a frame usually costs a few small patches rather than a full
+    screen. The reader lays the scanlines back on with a per-channel table
+    measured from the renderer. Call ``capture`` after every ``render()``;
+    the first captured frame is stored whole.
+
+    File layout: ``SNKV``, version, width, height (uint16 each), the 3x256
+    uint8 scanline table, then per frame the scanline phase (uint8) and a
+    uint16 patch count followed by ``x, y, w, h`` (uint16), the compressed
+    size (uint32) and the compressed bytes of every patch. Version 1 files
+    hold whole-screen patches and no table or phase.
+    """
+    def __init__(self, path, width, height, level=1):
+        self.file = open(path, 'wb')
+        self.width = width
+        self.height = height
+        self.level = level
+        self.frames = 0
+
+    def capture(self, env):
+        """Append the frame ``env.render()`` just drew."""
+        chunks = []
+        if self.frames == 0:
+            chunks.append(MAGIC + struct.pack('<HHH', VERSION, self.width, self.height))
+            chunks.append(env.scanline_table().tobytes())
+            rects = [env.screen.get_rect()]
+        else:
+            rects = [rect for rect in env.scene_rects if rect.width and rect.height]
+        pixels = env.frame(scanlines=False)
+        chunks.append(struct.pack('<BH', env.scanline_offset, len(rects)))
+        for rect in rects:
+            patch = pixels[rect.top:rect.bottom, rect.left:rect.right]
+            data = zlib.compress(np.ascontiguousarray(patch).tobytes(), self.level)
+            chunks.append(struct.pack('<HHHHI', rect.x, rect.y, rect.width, rect.height, len(data)))
+            chunks.append(data)
+        del pixels
+        self.file.write(b''.join(chunks))
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+def read_frames(path):
+    """Yield the recorded frames as (H, W, 3) uint8 arrays.
+
+    The same buffer is updated in place from frame to frame; copy a frame to
+    keep it past the next iteration.
+    """
+    with open(path, 'rb') as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path} is not a frame recording")
+        version, width, height = struct.unpack('<HHH', f.read(6))
+        if version not in (1, VERSION):
+            raise ValueError(f"Unsupported recording version {version}")
+        canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        if version > 1:
+            table = np.frombuffer(f.read(3 * 256), dtype=np.uint8).reshape(3, 256)
+            frame = np.empty_like(canvas)
+        header_format = '<H' if version == 1 else '<BH'
+        header_size = struct.calcsize(header_format)
+        while True:
+            header = f.read(header_size)
+            if len(header) < header_size:
+                return
+            *phase, count = struct.unpack(header_format, header)
+            for _ in range(count):
+                x, y, w, h, size = struct.unpack('<HHHHI', f.read(12))
+                patch = np.frombuffer(zlib.decompress(f.read(size)), dtype=np.uint8)
+                canvas[y:y + h, x:x + w] = patch.reshape(h, w, 3)
+            if version == 1:
+                yield canvas
+                continue
+            frame[:] = canvas
+            rows = frame[phase[0]::4]
+            for channel in range(3):
+                rows[:, :, channel] = table[channel][rows[:, :, channel]]
+            yield frame
+
+def record_episode(policy, path, width=36, height=36, seed=0, max_steps=None, env_options=None,
+                   opponent='idle'):
+    """Play one greedy game headlessly and record every frame to ``path``.
+
+    ``policy`` maps an (N, state_dim) batch of states to N actions for the AI
+    snake, as in ``train._run_evaluation``; ``env_options`` are extra
+    SnakeGame arguments such as the observation mode and ``opponent='bfs'``
+    lets ``planner.BFSPlanner`` play snake1. Returns the number of frames.
+    """
+    env = SnakeGame(width=width, height=height, seed=seed, headless=True, **(env_options or {}))
+    planner = BFSPlanner(snake_num=1) if opponent == 'bfs' else None
+    recorder = FrameRecorder(path, env.screen_width, env.screen_height)
+    try:
+        state = env.reset()
+        env.render()
+        recorder.capture(env)
+        done = False
+        while not done and (max_steps is None or env.steps < max_steps):
+            action = int(policy(state[None])[0])
+            action1 = planner.act(env) if planner is not None else None
+            state, _, done, _ = env.step(action1, action)
+            env.render()
+            recorder.capture(env)
+    finally:
+        recorder.close()
+        env.close()
+    return recorder.frames
+
+def export_png(path, out_dir):
+    """Write every frame of a recording as ``out_dir/frame_00000.png``."""
+    import pygame
+    os.makedirs(out_dir, exist_ok=True)
+    for i, frame in enumerate(read_frames(path)):
+        surface = pygame.surfarray.make_surface(frame.transpose(1, 0, 2))
+        pygame.image.save(surface, os.path.join(out_dir, f"frame_{i:05d}.png"))
+
+def export_gif(path, out_path, fps=15):
+    """Write a recording as an animated GIF (needs Pillow)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("GIF export needs Pillow: pip install pillow") from None
+    frames = [Image.fromarray(frame.copy()) for frame in read_frames(path)]
+    if not frames:
+        raise ValueError(f"{path} contains no frames")
+    frames[0].save(out_path, save_all=True, append_images=frames[1:],
+                   duration=int(1000 / fps), loop=0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a recorded episode")
+    parser.add_argument("recording", help="frame recording written by FrameRecorder")
+    parser.add_argument("--gif", default=None, help="write an animated GIF here")
+    parser.add_argument("--png-dir", default=None, help="write a PNG per frame into this directory")
+    parser.add_argument("--fps", type=int, default=15, help="GIF frame rate")
+    args = parser.parse_args()
+
+    if args.gif:
+        export_gif(args.recording, args.gif, args.fps)
+        print(f"GIF written to {args.gif}")
+    if args.png_dir:
+        export_png(args.recording, args.png_dir)
+        print(f"PNG frames written to {args.png_dir}")
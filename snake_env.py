@@ -4,6 +4,7 @@ from enum import Enum
 from collections import deque
 import random
 import math
+from profiler import timed
 
 class Direction(Enum):
     UP = 0
@@ -11,20 +12,87 @@ class Direction(Enum):
     DOWN = 2
     LEFT = 3
 
+# Number of summary features after the grid in both observation modes
+EXTRA_FEATURES = 10
+
+# Food-vector rotation into a snake's view, indexed by heading (Direction value):
+# u = _ROT_A * dx + _ROT_B * dy, v = -_ROT_B * dx + _ROT_A * dy
+_ROT_A = (1, 0, -1, 0)
+_ROT_B = (0, 1, 0, -1)
+
+def _view_offsets(view_size):
+    """Board offsets (dx, dy) of the cells of a head-centred view_size x
+    view_size crop in row-major order, per heading, rotated so that the
+    heading points up. Each has shape (4, view_size * view_size)."""
+    r = view_size // 2
+    v, u = np.mgrid[-r:r + 1, -r:r + 1]
+    u, v = u.ravel(), v.ravel()
+    return np.stack([u, -v, -u, v]), np.stack([v, u, -v, -u])
+
 class SnakeGame:
-    def __init__(self, width=36, height=36, gui=False):
+    def __init__(self, width=36, height=36, gui=False, copy_state=True, seed=None, headless=False,
+                 self_play=False, observation='grid', view_size=11):
         self.width = width
         self.height = height
-        self.gui = gui
+        
+        # 'grid': the whole board plus 10 features, from snake2's side.
+        # 'local': a view_size x view_size crop around the snake's head, rotated
+        # so it faces up, plus 10 features; its size does not depend on the
+        # board. Learner actions are then relative to the heading (see step).
+        if observation not in ('grid', 'local'):
+            raise ValueError(f"observation must be 'grid' or 'local', got {observation!r}")
+        if view_size % 2 == 0:
+            raise ValueError(f"view_size must be odd, got {view_size}")
+        self.observation = observation
+        self.view_size = view_size
+        self._view_dx, self._view_dy = _view_offsets(view_size)
+        
+        # self_play: observations for both snakes (see _observe) and food
+        # shaping for snake1's reward as well
+        self.self_play = self_play
+        
+        # headless draws the same visuals to an offscreen surface (no window)
+        self.headless = headless
+        self.gui = gui or headless
+        self.rng = random.Random(seed)
+        
+        # Persistent observation buffer, updated in place as cells change.
+        # With copy_state=False, reset/step return a read-only view of it.
+        self.copy_state = copy_state
+        self._state = np.zeros(width * height * 3 + 10, dtype=np.float32)
+        self._grid = self._state[:width * height * 3].reshape(height, width, 3)
+        self._state_view = self._state.view()
+        self._state_view.flags.writeable = False
+        
+        # With self_play, snake1's mirrored grid (snake channels swapped) is
+        # kept up to date alongside it
+        if self_play and observation == 'grid':
+            self._mirror = np.zeros_like(self._state)
+            self._mirror_grid = self._mirror[:width * height * 3].reshape(height, width, 3)
+        else:
+            self._mirror_grid = None
+        
+        # Per-cell owner bitmask (1 = snake1, 2 = snake2) for O(1) collision checks
+        self.occupancy = np.zeros((height, width), dtype=np.int8)
+        
+        # Free-cell index: unordered list of empty flat cells plus each cell's
+        # position in it (-1 when occupied), maintained by swap-remove
+        self._free_cells = []
+        self._free_pos = [-1] * (width * height)
+        self.food = None
         self.reset()
         
-        if gui:
-            pygame.init()
+        if self.gui:
             self.cell_size = 20
             self.screen_width = width * self.cell_size
             self.screen_height = height * self.cell_size + 80
-            self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
-            pygame.display.set_caption("🐍 RETRO SNAKE BATTLE 🐍")
+            if headless:
+                pygame.font.init()
+                self.screen = pygame.Surface((self.screen_width, self.screen_height))
+            else:
+                pygame.init()
+                self.screen = pygame.display.set_mode((self.screen_width, self.screen_height))
+                pygame.display.set_caption("🐍 RETRO SNAKE BATTLE 🐍")
             
             # Enhanced fonts with retro styling
             self.font_small = pygame.font.Font(None, 24)
@@ -57,79 +125,227 @@ class SnakeGame:
             self.food_pulse = 0
             self.scanline_offset = 0
             self.game_time = 0
+            
+            self._init_render_cache()
     
     def reset(self):
         self.snake1 = deque([(self.width//4, self.height//2)])
         self.snake2 = deque([(3*self.width//4, self.height//2)])
         self.direction1 = Direction.RIGHT
         self.direction2 = Direction.LEFT
-        self.food = self._place_food()
+        
+        self.food = None
+        self._rebuild_caches()
+        self._place_food()
+        
         self.score1 = 0
         self.score2 = 0
         self.done = False
         self.winner = None
         self.steps = 0
+        self.last_food_distance1 = self._food_distance(1)
         self.last_food_distance2 = self._food_distance(2)
-        return self._get_state()
+        return self._observe()
+    
+    def seed(self, seed=None):
+        self.rng.seed(seed)
+    
+    def _rebuild_caches(self):
+        """Recompute occupancy, free cells and the observation grid from the
+        snakes and food."""
+        self.occupancy[:] = 0
+        self._state[:] = 0.0
+        if self._mirror_grid is not None:
+            self._mirror[:] = 0.0
+        self._free_cells = list(range(self.width * self.height))
+        self._free_pos = list(range(self.width * self.height))
+        for snake_num, snake in ((1, self.snake1), (2, self.snake2)):
+            for x, y in snake:
+                self._occupy(x, y, snake_num)
+        if self.food is not None:
+            self._mark_food(1.0)
+    
+    def _occupy(self, x, y, snake_num):
+        self.occupancy[y, x] |= snake_num
+        self._grid[y, x, snake_num - 1] = 1.0
+        if self._mirror_grid is not None:
+            self._mirror_grid[y, x, 2 - snake_num] = 1.0
+        
+        # Swap-remove the cell from the free list
+        cell = y * self.width + x
+        pos = self._free_pos[cell]
+        if pos >= 0:
+            last = self._free_cells.pop()
+            if last != cell:
+                self._free_cells[pos] = last
+                self._free_pos[last] = pos
+            self._free_pos[cell] = -1
+    
+    def _vacate(self, x, y, snake_num):
+        self.occupancy[y, x] &= ~snake_num
+        self._grid[y, x, snake_num - 1] = 0.0
+        if self._mirror_grid is not None:
+            self._mirror_grid[y, x, 2 - snake_num] = 0.0
+        
+        cell = y * self.width + x
+        if not self.occupancy[y, x] and self._free_pos[cell] < 0:
+            self._free_pos[cell] = len(self._free_cells)
+            self._free_cells.append(cell)
+    
+    def _mark_food(self, value):
+        x, y = self.food
+        self._grid[y, x, 2] = value
+        if self._mirror_grid is not None:
+            self._mirror_grid[y, x, 2] = value
     
     def _place_food(self):
-        while True:
-            food = (random.randint(0, self.width-1), random.randint(0, self.height-1))
-            if food not in self.snake1 and food not in self.snake2:
-                return food
+        """Put food on a uniformly random free cell in O(1).
+        
+        Sets ``self.food`` to None when the board is completely covered, which
+        ``step`` treats as the end of the game.
+        """
+        if self.food is not None:
+            self._mark_food(0.0)
+        
+        if not self._free_cells:
+            self.food = None
+            return None
+        
+        cell = self._free_cells[self.rng.randrange(len(self._free_cells))]
+        self.food = (cell % self.width, cell // self.width)
+        self._mark_food(1.0)
+        return self.food
     
     def _food_distance(self, snake_num):
+        if self.food is None:
+            return 0
         if snake_num == 1:
             head = self.snake1[0]
         else:
             head = self.snake2[0]
         return abs(head[0] - self.food[0]) + abs(head[1] - self.food[1])
     
-    def _get_state(self):
-        # Create a grid representation
-        grid = np.zeros((self.height, self.width, 3), dtype=np.float32)
-        
-        # Mark snake1 positions (channel 0)
-        for segment in self.snake1:
-            grid[segment[1], segment[0], 0] = 1.0
+    @timed('env.get_state')
+    def _get_state(self, copy=True):
+        """Return the observation, as a fresh copy or a read-only view of the
+        persistent buffer (valid until the next reset/step)."""
+        if self.observation == 'local':
+            return self._get_local_state(2)
         
-        # Mark snake2 positions (channel 1)
-        for segment in self.snake2:
-            grid[segment[1], segment[0], 1] = 1.0
-        
-        # Mark food position (channel 2)
-        grid[self.food[1], self.food[0], 2] = 1.0
+        # The grid part is kept up to date by reset, _move_snake and _place_food;
+        # only the trailing direction and food features are refreshed here.
+        n = self.width * self.height * 3
+        extra = self._state[n:]
+        extra[:] = 0.0
         
         # Add direction information
-        direction1_onehot = np.zeros(4, dtype=np.float32)
-        direction1_onehot[self.direction1.value] = 1.0
-        
-        direction2_onehot = np.zeros(4, dtype=np.float32)
-        direction2_onehot[self.direction2.value] = 1.0
+        extra[self.direction1.value] = 1.0
+        extra[4 + self.direction2.value] = 1.0
         
         # Add food direction information (relative to snake2 head)
-        head_x, head_y = self.snake2[0]
-        food_dx = self.food[0] - head_x
-        food_dy = self.food[1] - head_y
-        food_direction = np.array([food_dx, food_dy], dtype=np.float32)
+        self._food_features(extra, self.snake2[0])
         
-        # Normalize food direction
-        if abs(food_dx) + abs(food_dy) > 0:
-            food_direction = food_direction / (abs(food_dx) + abs(food_dy))
+        if copy:
+            return self._state.copy()
+        return self._state_view
+    
+    def _food_features(self, extra, head):
+        """Food direction relative to ``head``, normalized by Manhattan distance;
+        left at zero once the board is full and there is no food."""
+        if self.food is not None:
+            head_x, head_y = head
+            food_dx = self.food[0] - head_x
+            food_dy = self.food[1] - head_y
+            extra[8] = food_dx
+            extra[9] = food_dy
+            
+            # Normalize food direction
+            if abs(food_dx) + abs(food_dy) > 0:
+                extra[8:] /= np.float32(abs(food_dx) + abs(food_dy))
+    
+    def _get_mirrored_state(self):
+        """Snake1's observation, laid out as if it were snake2: own body in
+        channel 1, own direction in features 4-7, food relative to own head.
+        Returns the persistent mirrored buffer, valid until the next step."""
+        n = self.width * self.height * 3
+        extra = self._mirror[n:]
+        extra[:] = 0.0
+        extra[self.direction2.value] = 1.0
+        extra[4 + self.direction1.value] = 1.0
+        self._food_features(extra, self.snake1[0])
+        return self._mirror
+    
+    def _get_local_state(self, snake_num):
+        """Head-centred crop of the wrapping board, turned so the snake's
+        heading points up: (view, view, 3) with the opponent in channel 0,
+        the snake itself in channel 1 and food in channel 2. The 10 features
+        after it are the opponent's heading relative to ours (one-hot), the
+        food direction in view coordinates and its proximity, the share of
+        the starvation budget left and both lengths squashed to [0, 1).
+        Costs the same on any board size."""
+        if snake_num == 1:
+            snake, other, heading, other_heading = self.snake1, self.snake2, self.direction1, self.direction2
+        else:
+            snake, other, heading, other_heading = self.snake2, self.snake1, self.direction2, self.direction1
+        heading = heading.value
+        head_x, head_y = snake[0]
+        xs = (head_x + self._view_dx[heading]) % self.width
+        ys = (head_y + self._view_dy[heading]) % self.height
+        occupancy = self.occupancy[ys, xs]
         
-        # Flatten everything
-        flat_grid = grid.flatten()
-        state = np.concatenate([flat_grid, direction1_onehot, direction2_onehot, food_direction])
+        n = len(xs) * 3
+        state = np.zeros(n + EXTRA_FEATURES, dtype=np.float32)
+        grid = state[:n].reshape(-1, 3)
+        grid[:, 0] = (occupancy & (3 - snake_num)) != 0
+        grid[:, 1] = (occupancy & snake_num) != 0
         
+        extra = [0.0] * EXTRA_FEATURES
+        extra[(other_heading.value - heading) % 4] = 1.0
+        if self.food is not None:
+            grid[:, 2] = (xs == self.food[0]) & (ys == self.food[1])
+            food_dx, food_dy = self.food[0] - head_x, self.food[1] - head_y
+            distance = abs(food_dx) + abs(food_dy)
+            norm = max(distance, 1)
+            extra[4] = (_ROT_A[heading] * food_dx + _ROT_B[heading] * food_dy) / norm
+            extra[5] = (-_ROT_B[heading] * food_dx + _ROT_A[heading] * food_dy) / norm
+            extra[6] = 1 / (1 + distance)
+        extra[7] = max(0.0, 1 - self.steps / (100 * (self.score1 + self.score2 + 1)))
+        extra[8] = len(snake) / (len(snake) + 10)
+        extra[9] = len(other) / (len(other) + 10)
+        state[n:] = extra
         return state
     
+    def _observe(self):
+        """What reset/step return: snake2's observation, or with self_play an
+        array of shape (2, state_dim) holding snake1's mirrored view and
+        snake2's view, so one batched forward acts for both snakes."""
+        if self.self_play:
+            if self.observation == 'local':
+                return np.stack((self._get_local_state(1), self._get_local_state(2)))
+            return np.stack((self._get_mirrored_state(), self._get_state(copy=False)))
+        return self._get_state(self.copy_state)
+    
+    def _absolute_actions(self, action1, action2):
+        """Turn learner actions given relative to the heading (local
+        observations: 0 = ahead, 1 = right, 3 = left) into Direction values.
+        That is snake2's action, and snake1's with self_play; snake1 is
+        otherwise a human or scripted player using absolute directions."""
+        if self.observation == 'local':
+            if action2 is not None:
+                action2 = (int(action2) + self.direction2.value) % 4
+            if action1 is not None and self.self_play:
+                action1 = (int(action1) + self.direction1.value) % 4
+        return action1, action2
+    
+    @timed('env.step')
     def step(self, action1=None, action2=None):
         if self.done:
-            return self._get_state(), (0, 0), self.done, self.winner
+            return self._observe(), (0, 0), self.done, self.winner
         
         self.steps += 1
         
         # Update directions
+        action1, action2 = self._absolute_actions(action1, action2)
         if action1 is not None:
             self._update_direction(1, action1)
         if action2 is not None:
@@ -139,6 +355,12 @@ class SnakeGame:
         reward1, dead1 = self._move_snake(1)
         reward2, dead2 = self._move_snake(2)
         
+        # Board completely covered: no room for food, decide on score
+        if self.food is None:
+            self.done = True
+            self.winner = self._winner_by_score()
+            return self._observe(), (reward1, reward2), self.done, self.winner
+        
         # Additional reward for moving toward food (for AI snake)
         current_food_distance = self._food_distance(2)
         if current_food_distance < self.last_food_distance2:
@@ -147,37 +369,50 @@ class SnakeGame:
             reward2 -= 0.5
         self.last_food_distance2 = current_food_distance
         
-        # Check for collisions between snakes
+        # Same shaping for snake1 when it is also a learner
+        if self.self_play:
+            current_food_distance = self._food_distance(1)
+            if current_food_distance < self.last_food_distance1:
+                reward1 += 1
+            elif current_food_distance > self.last_food_distance1:
+                reward1 -= 0.5
+            self.last_food_distance1 = current_food_distance
+        
+        # Check for collisions between snakes (heads differ past the draw check,
+        # so an occupancy hit means the other snake's body)
         head1 = self.snake1[0]
         head2 = self.snake2[0]
         
         if head1 == head2:
             self.done = True
             self.winner = "Draw"
-            return self._get_state(), (reward1-10, reward2-10), self.done, self.winner
+            return self._observe(), (reward1-10, reward2-10), self.done, self.winner
         
-        if head1 in list(self.snake2)[1:]:
+        if self.occupancy[head1[1], head1[0]] & 2:
             self.done = True
             self.winner = "Snake2"
-            return self._get_state(), (reward1-10, reward2+5), self.done, self.winner
+            return self._observe(), (reward1-10, reward2+5), self.done, self.winner
         
-        if head2 in list(self.snake1)[1:]:
+        if self.occupancy[head2[1], head2[0]] & 1:
             self.done = True
             self.winner = "Snake1"
-            return self._get_state(), (reward1+5, reward2-10), self.done, self.winner
+            return self._observe(), (reward1+5, reward2-10), self.done, self.winner
         
         # Check for starvation
         if self.steps > 100 * (self.score1 + self.score2 + 1):
             self.done = True
-            if self.score1 > self.score2:
-                self.winner = "Snake1"
-            elif self.score2 > self.score1:
-                self.winner = "Snake2"
-            else:
-                self.winner = "Draw"
-            return self._get_state(), (reward1, reward2), self.done, self.winner
+            self.winner = self._winner_by_score()
+            return self._observe(), (reward1, reward2), self.done, self.winner
         
-        return self._get_state(), (reward1, reward2), self.done, None
+        # A self-collision in _move_snake ends the game without an early return
+        return self._observe(), (reward1, reward2), self.done, self.winner
+    
+    def _winner_by_score(self):
+        if self.score1 > self.score2:
+            return "Snake1"
+        elif self.score2 > self.score1:
+            return "Snake2"
+        return "Draw"
     
     def _update_direction(self, snake_num, action):
         if snake_num == 1:
@@ -218,8 +453,8 @@ class SnakeGame:
         else:  # RIGHT
             new_head = ((head_x + 1) % self.width, head_y)
         
-        # Check for self-collision
-        if new_head in list(snake)[:-1]:
+        # Check for self-collision (the tail cell is about to be vacated)
+        if self.occupancy[new_head[1], new_head[0]] & snake_num and new_head != snake[-1]:
             self.done = True
             # Set winner based on which snake collided with itself
             if snake_num == 1:
@@ -228,89 +463,185 @@ class SnakeGame:
                 self.winner = "Snake1"  # Human wins if AI crashes
             return -10, True
         
-        # Move snake
+        # Move snake (vacate the tail first, the new head may take its cell)
+        ate = new_head == food
+        if not ate:
+            tail = snake.pop()
+            self._vacate(tail[0], tail[1], snake_num)
         snake.appendleft(new_head)
+        self._occupy(new_head[0], new_head[1], snake_num)
         
         # Check if food eaten
-        if new_head == food:
-            self.food = self._place_food()
+        if ate:
+            self._place_food()
             if snake_num == 1:
                 self.score1 += 1
             else:
                 self.score2 += 1
             return 10, False
-        else:
-            snake.pop()
-            return 0, False
+        return 0, False
+    
+    def _init_render_cache(self):
+        """Pre-bake everything that does not change from frame to frame."""
+        cs = self.cell_size
+        
+        # Background: fill, grid and the static part of the UI panel
+        self._background = pygame.Surface((self.screen_width, self.screen_height), 0, self.screen)
+        background = self._background
+        background.fill(self.colors['background'])
+        for x in range(0, self.screen_width, cs):
+            pygame.draw.line(background, self.colors['grid'], 
+                           (x, 80), (x, self.screen_height), 1)
+        for y in range(80, self.screen_height, cs):
+            pygame.draw.line(background, self.colors['grid'], 
+                           (0, y), (self.screen_width, y), 1)
+        pygame.draw.rect(background, self.colors['ui_bg'], pygame.Rect(0, 0, self.screen_width, 80))
+        pygame.draw.line(background, self.colors['ui_border'], 
+                        (0, 78), (self.screen_width, 78), 2)
+        pygame.draw.line(background, self.colors['ui_border'], 
+                        (0, 80), (self.screen_width, 80), 1)
+        title_text = self.font_medium.render("RETRO SNAKE BATTLE", True, self.colors['text_primary'])
+        background.blit(title_text, title_text.get_rect(center=(self.screen_width // 2, 25)))
+        
+        # Retro CRT scanlines, laid over everything and scrolled by
+        # scanline_offset: screen row y shows row y + 4 - scanline_offset
+        self._scanlines = pygame.Surface((self.screen_width, self.screen_height + 4), pygame.SRCALPHA)
+        for y in range(4, self.screen_height + 4, 4):
+            pygame.draw.line(self._scanlines, self.colors['scanline'], 
+                           (0, y), (self.screen_width, y))
+        
+        # Every layer under the scanlines; dirty rectangles are repainted here
+        # and then composited onto the screen with the scanlines on top
+        self._scene = pygame.Surface((self.screen_width, self.screen_height), 0, self.screen)
+        
+        # Segment sprites keyed by (snake_num, part) with part 0 = head, 1 = body, 2 = tail
+        self._segment_sprites = {}
+        for snake_num in (1, 2):
+            for part, name in enumerate(('head', 'body', 'tail')):
+                color = self.colors[f'snake{snake_num}_{name}']
+                sprite = pygame.Surface((cs, cs), pygame.SRCALPHA)
+                rect = sprite.get_rect()
+                pygame.draw.rect(sprite, color, rect, border_radius=3)
+                highlight_color = tuple(min(255, c + 30) for c in color)
+                pygame.draw.rect(sprite, highlight_color, rect.inflate(-4, -4), 
+                                width=1, border_radius=2)
+                self._segment_sprites[snake_num, part] = sprite
+        
+        self._glow_sprites = {}
+        self._texts = {}
+        
+        # What the previous frame drew: occupied cells and the moving overlays
+        self._drawn_cells = {}
+        self._drawn_items = {}
+        self._full_redraw = True
+        self.dirty_rects = []
+        self.scene_rects = []
+    
+    def _glow_sprite(self, color, radius):
+        """Glow sprite for ``color`` and ``radius`` plus its visible bounds."""
+        key = (color[:3], radius)
+        cached = self._glow_sprites.get(key)
+        if cached is None:
+            sprite = pygame.Surface((radius * 4, radius * 4), pygame.SRCALPHA)
+            for i in range(radius, 0, -2):
+                alpha = max(5, 30 - i)
+                glow_color = (*color[:3], alpha)
+                pygame.draw.circle(sprite, glow_color, (radius * 2, radius * 2), i)
+            cached = self._glow_sprites[key] = (sprite, sprite.get_bounding_rect())
+        return cached
     
     def _draw_glow_effect(self, surface, color, center, radius):
         """Draw a glowing effect around a point"""
-        glow_surface = pygame.Surface((radius * 4, radius * 4), pygame.SRCALPHA)
-        for i in range(radius, 0, -2):
-            alpha = max(5, 30 - i)
-            glow_color = (*color[:3], alpha)
-            pygame.draw.circle(glow_surface, glow_color, (radius * 2, radius * 2), i)
-        surface.blit(glow_surface, (center[0] - radius * 2, center[1] - radius * 2))
-    
-    def _draw_snake_segment(self, x, y, snake_num, segment_index, total_segments):
-        """Draw an enhanced snake segment with gradient and glow"""
-        rect = pygame.Rect(x * self.cell_size, y * self.cell_size + 80, 
+        sprite, _ = self._glow_sprite(color, radius)
+        surface.blit(sprite, (center[0] - radius * 2, center[1] - radius * 2))
+    
+    def _glow_rect(self, color, center, radius):
+        _, bounds = self._glow_sprite(color, radius)
+        return bounds.move(center[0] - radius * 2, center[1] - radius * 2)
+    
+    def _text(self, slot, font, text, color):
+        """Rendered text for a UI slot, re-rendered only when the text changes."""
+        cached = self._texts.get(slot)
+        if cached is None or cached[0] != (text, color):
+            cached = self._texts[slot] = ((text, color), font.render(text, True, color))
+        return cached[1]
+    
+    def _cell_rect(self, x, y):
+        return pygame.Rect(x * self.cell_size, y * self.cell_size + 80, 
                           self.cell_size, self.cell_size)
-        
-        # Calculate color based on position in snake (gradient effect)
-        if snake_num == 1:
-            if segment_index == 0:  # Head
-                color = self.colors['snake1_head']
-                glow_color = self.colors['glow_green']
-            elif segment_index < total_segments * 0.3:  # Body
-                color = self.colors['snake1_body']
-                glow_color = None
-            else:  # Tail
-                color = self.colors['snake1_tail']
-                glow_color = None
-        else:
-            if segment_index == 0:  # Head
-                color = self.colors['snake2_head']
-                glow_color = self.colors['glow_magenta']
-            elif segment_index < total_segments * 0.3:  # Body
-                color = self.colors['snake2_body']
-                glow_color = None
-            else:  # Tail
-                color = self.colors['snake2_tail']
-                glow_color = None
-        
-        # Draw glow effect for head
-        if glow_color and segment_index == 0:
-            center = (rect.centerx, rect.centery)
-            self._draw_glow_effect(self.screen, glow_color, center, self.cell_size)
-        
-        # Draw main segment with rounded corners
-        pygame.draw.rect(self.screen, color, rect, border_radius=3)
-        
-        # Add highlight for 3D effect
-        highlight_rect = pygame.Rect(rect.x + 2, rect.y + 2, 
-                                   rect.width - 4, rect.height - 4)
-        highlight_color = tuple(min(255, c + 30) for c in color)
-        pygame.draw.rect(self.screen, highlight_color, highlight_rect, 
-                        width=1, border_radius=2)
     
-    def _draw_food(self):
-        """Draw animated food with pulsing glow effect"""
+    def _snake_cells(self):
+        """Sprite keys of every occupied cell in draw order (head, then body for
+        the first 30% of the snake, then tail); a cell holds several keys when
+        segments overlap, e.g. after a head-on collision."""
+        cells = {}
+        for snake_num, snake in ((1, self.snake1), (2, self.snake2)):
+            body_end = len(snake) * 0.3
+            for i, segment in enumerate(snake):
+                key = (snake_num, 0 if i == 0 else 1 if i < body_end else 2)
+                cells[segment] = cells.get(segment, ()) + (key,)
+        return cells
+    
+    def _food_geometry(self):
         food_x, food_y = self.food
-        rect = pygame.Rect(food_x * self.cell_size, food_y * self.cell_size + 80,
-                          self.cell_size, self.cell_size)
+        rect = self._cell_rect(food_x, food_y)
         
         # Pulsing animation
         pulse_size = int(3 * math.sin(self.food_pulse * 0.3))
+        return rect, pulse_size
+    
+    def _scene_items(self):
+        """Moving overlays of the current frame: ``{name: (content, rect)}``.
+        
+        An item is redrawn when its content changes; the UI texts use their
+        string as content so they are only re-rendered when it changes.
+        """
+        items = {}
+        if self.food is not None:
+            rect, pulse_size = self._food_geometry()
+            glow = self._glow_rect(self.colors['food_glow'], rect.center, self.cell_size + pulse_size)
+            items['food'] = ((self.food, pulse_size), glow.union(rect.inflate(pulse_size, pulse_size)))
+        for snake_num, snake in ((1, self.snake1), (2, self.snake2)):
+            if snake:
+                center = self._cell_rect(*snake[0]).center
+                glow_color = self.colors['glow_green' if snake_num == 1 else 'glow_magenta']
+                items[f'glow{snake_num}'] = (center, self._glow_rect(glow_color, center, self.cell_size))
+        for slot, (text, surface, rect) in self._ui_texts().items():
+            items[slot] = (text, rect)
+        return items
+    
+    def _ui_texts(self):
+        """Score and move counters as ``{slot: (text, surface, rect)}``."""
+        human = f"🎮 HUMAN: {self.score1:02d}"
+        ai = f"🤖 AI: {self.score2:02d}"
+        steps = f"MOVES: {self.steps}"
+        human_text = self._text('human', self.font_small, human, self.colors['snake1_head'])
+        ai_text = self._text('ai', self.font_small, ai, self.colors['snake2_head'])
+        steps_text = self._text('steps', self.font_small, steps, self.colors['text_secondary'])
+        return {
+            'human': (human, human_text, human_text.get_rect(topleft=(20, 50))),
+            'ai': (ai, ai_text, ai_text.get_rect(topleft=(self.screen_width - 120, 50))),
+            'steps': (steps, steps_text, steps_text.get_rect(center=(self.screen_width // 2, 55))),
+        }
+    
+    def _draw_snake_segment(self, x, y, snake_num, part):
+        """Blit the pre-baked head/body/tail sprite for one segment"""
+        self._scene.blit(self._segment_sprites[snake_num, part], self._cell_rect(x, y))
+    
+    def _draw_food(self):
+        """Draw animated food with pulsing glow effect"""
+        if self.food is None:
+            return
+        rect, pulse_size = self._food_geometry()
         expanded_rect = rect.inflate(pulse_size, pulse_size)
         
         # Draw glow effect
         center = (rect.centerx, rect.centery)
         glow_radius = self.cell_size + pulse_size
-        self._draw_glow_effect(self.screen, self.colors['food_glow'], center, glow_radius)
+        self._draw_glow_effect(self._scene, self.colors['food_glow'], center, glow_radius)
         
         # Draw main food
-        pygame.draw.ellipse(self.screen, self.colors['food'], expanded_rect)
+        pygame.draw.ellipse(self._scene, self.colors['food'], expanded_rect)
         
         # Add sparkle effect
         sparkle_color = (255, 255, 255)
@@ -321,51 +652,19 @@ class SnakeGame:
             (rect.centerx - 3, rect.centery + 3)
         ]
         for point in sparkle_points:
-            pygame.draw.circle(self.screen, sparkle_color, point, 1)
-    
-    def _draw_scanlines(self):
-        """Draw retro CRT scanlines effect"""
-        scanline_surface = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA)
-        for y in range(0, self.screen_height, 4):
-            pygame.draw.line(scanline_surface, self.colors['scanline'], 
-                           (0, y + self.scanline_offset), (self.screen_width, y + self.scanline_offset))
-        self.screen.blit(scanline_surface, (0, 0))
+            pygame.draw.circle(self._scene, sparkle_color, point, 1)
     
     def _draw_ui_panel(self):
-        """Draw enhanced UI panel with retro styling"""
-        # Main UI background
-        ui_rect = pygame.Rect(0, 0, self.screen_width, 80)
-        pygame.draw.rect(self.screen, self.colors['ui_bg'], ui_rect)
-        
-        # Border lines
-        pygame.draw.line(self.screen, self.colors['ui_border'], 
-                        (0, 78), (self.screen_width, 78), 2)
-        pygame.draw.line(self.screen, self.colors['ui_border'], 
-                        (0, 80), (self.screen_width, 80), 1)
-        
-        # Title
-        title_text = self.font_medium.render("RETRO SNAKE BATTLE", True, self.colors['text_primary'])
-        title_rect = title_text.get_rect(center=(self.screen_width // 2, 25))
-        self.screen.blit(title_text, title_rect)
-        
-        # Player scores with icons
-        human_text = self.font_small.render(f"🎮 HUMAN: {self.score1:02d}", True, self.colors['snake1_head'])
-        ai_text = self.font_small.render(f"🤖 AI: {self.score2:02d}", True, self.colors['snake2_head'])
-        
-        self.screen.blit(human_text, (20, 50))
-        self.screen.blit(ai_text, (self.screen_width - 120, 50))
-        
-        # Game stats
-        steps_text = self.font_small.render(f"MOVES: {self.steps}", True, self.colors['text_secondary'])
-        steps_rect = steps_text.get_rect(center=(self.screen_width // 2, 55))
-        self.screen.blit(steps_text, steps_rect)
+        """Draw the cached score and move counters over the baked panel"""
+        for text, surface, rect in self._ui_texts().values():
+            self._scene.blit(surface, rect)
     
     def _draw_game_over_screen(self):
         """Draw enhanced game over screen"""
         # Semi-transparent overlay
         overlay = pygame.Surface((self.screen_width, self.screen_height), pygame.SRCALPHA)
         overlay.fill((0, 0, 0, 180))
-        self.screen.blit(overlay, (0, 0))
+        self._scene.blit(overlay, (0, 0))
         
         # Glitch effect for game over text
         center_y = self.screen_height // 2
@@ -382,77 +681,470 @@ class SnakeGame:
             winner_color = self.colors['text_primary']
         
         # Main winner text with glow
-        winner_surface = self.font_large.render(winner_text, True, winner_color)
+        winner_surface = self._text('winner', self.font_large, winner_text, winner_color)
         winner_rect = winner_surface.get_rect(center=(self.screen_width // 2, center_y - 40))
         
         # Draw glow behind text
-        glow_surface = self.font_large.render(winner_text, True, (*winner_color[:3], 100))
+        glow_surface = self._text('winner_glow', self.font_large, winner_text, (*winner_color[:3], 100))
         for offset in [(2, 2), (-2, -2), (2, -2), (-2, 2)]:
             glow_rect = winner_rect.copy()
             glow_rect.x += offset[0]
             glow_rect.y += offset[1]
-            self.screen.blit(glow_surface, glow_rect)
+            self._scene.blit(glow_surface, glow_rect)
         
-        self.screen.blit(winner_surface, winner_rect)
+        self._scene.blit(winner_surface, winner_rect)
         
         # Final scores
         score_text = f"FINAL SCORE - HUMAN: {self.score1}  AI: {self.score2}"
-        score_surface = self.font_medium.render(score_text, True, self.colors['text_secondary'])
+        score_surface = self._text('final_score', self.font_medium, score_text, self.colors['text_secondary'])
         score_rect = score_surface.get_rect(center=(self.screen_width // 2, center_y + 20))
-        self.screen.blit(score_surface, score_rect)
+        self._scene.blit(score_surface, score_rect)
         
         # Restart instruction with blinking effect
         blink = int(self.game_time * 3) % 2
         if blink:
             restart_text = "PRESS [R] TO RESTART"
-            restart_surface = self.font_small.render(restart_text, True, self.colors['text_primary'])
+            restart_surface = self._text('restart', self.font_small, restart_text, self.colors['text_primary'])
             restart_rect = restart_surface.get_rect(center=(self.screen_width // 2, center_y + 60))
-            self.screen.blit(restart_surface, restart_rect)
+            self._scene.blit(restart_surface, restart_rect)
+    
+    def _redraw(self, rect, cells, game_over):
+        """Repaint ``rect`` of the scene from the layers: background, UI text,
+        food, snake1 (glow under its segments), snake2, game over."""
+        scene = self._scene
+        scene.set_clip(rect)
+        scene.blit(self._background, rect, rect)
+        self._draw_ui_panel()
+        self._draw_food()
+        
+        # Cells touched by the rectangle
+        cs = self.cell_size
+        x0, x1 = max(rect.left // cs, 0), min((rect.right - 1) // cs, self.width - 1)
+        y0, y1 = max((rect.top - 80) // cs, 0), min((rect.bottom - 81) // cs, self.height - 1)
+        for snake_num, snake in ((1, self.snake1), (2, self.snake2)):
+            if snake:
+                glow_color = self.colors['glow_green' if snake_num == 1 else 'glow_magenta']
+                self._draw_glow_effect(scene, glow_color, self._cell_rect(*snake[0]).center, cs)
+            for y in range(y0, y1 + 1):
+                for x in range(x0, x1 + 1):
+                    for key in cells.get((x, y), ()):
+                        if key[0] == snake_num:
+                            self._draw_snake_segment(x, y, snake_num, key[1])
+        
+        if game_over:
+            self._draw_game_over_screen()
+        scene.set_clip(None)
+    
+    def _scanline_bands(self, previous):
+        """Rows whose scanline changes when the scroll moves on from
+        ``previous``: each line and the row below it, as 2-pixel bands."""
+        screen_rect = self.screen.get_rect()
+        start = previous if previous < 3 else -1
+        return [pygame.Rect(0, y, self.screen_width, 2).clip(screen_rect)
+                for y in range(start, self.screen_height, 4)]
     
     def render(self):
+        """Draw the current frame, repainting only what changed since the last
+        one; the repainted rectangles are left in ``dirty_rects``, the ones
+        where the scene under the scanlines changed in ``scene_rects``."""
         if not self.gui:
             return
         
         # Update animation variables
         self.food_pulse += 1
+        previous_offset = self.scanline_offset
         self.scanline_offset = (self.scanline_offset + 1) % 4
         self.game_time += 0.016  # Approximate 60 FPS
         
-        # Clear screen with background
-        self.screen.fill(self.colors['background'])
+        cells = self._snake_cells()
+        items = self._scene_items()
+        game_over = bool(self.done and self.winner)
+        screen_rect = self.screen.get_rect()
         
-        # Draw subtle grid
-        for x in range(0, self.screen_width, self.cell_size):
-            pygame.draw.line(self.screen, self.colors['grid'], 
-                           (x, 80), (x, self.screen_height), 1)
-        for y in range(80, self.screen_height, self.cell_size):
-            pygame.draw.line(self.screen, self.colors['grid'], 
-                           (0, y), (self.screen_width, y), 1)
-        
-        # Draw UI panel
-        self._draw_ui_panel()
-        
-        # Draw food with animation
-        self._draw_food()
+        # The game over overlay covers the whole screen, so it (and the frame
+        # after it) is a full repaint
+        if self._full_redraw or game_over:
+            dirty = [screen_rect]
+        else:
+            dirty = []
+            previous_cells = self._drawn_cells
+            for cell, key in cells.items():
+                if previous_cells.get(cell) != key:
+                    dirty.append(self._cell_rect(*cell))
+            for cell in previous_cells:
+                if cell not in cells:
+                    dirty.append(self._cell_rect(*cell))
+            previous_items = self._drawn_items
+            for name in items.keys() | previous_items.keys():
+                old, new = previous_items.get(name), items.get(name)
+                if old == new:
+                    continue
+                if old is not None:
+                    dirty.append(old[1])
+                if new is not None:
+                    dirty.append(new[1])
+            dirty = [rect.clip(screen_rect) for rect in dirty]
         
-        # Draw snakes with enhanced visuals
-        for i, segment in enumerate(self.snake1):
-            x, y = segment
-            self._draw_snake_segment(x, y, 1, i, len(self.snake1))
+        for rect in dirty:
+            self._redraw(rect, cells, game_over)
+        self.scene_rects = list(dirty)
         
-        for i, segment in enumerate(self.snake2):
-            x, y = segment
-            self._draw_snake_segment(x, y, 2, i, len(self.snake2))
+        # The scrolling scanlines change their old and new rows on every frame
+        if dirty != [screen_rect]:
+            dirty += self._scanline_bands(previous_offset)
+        scanline_shift = 4 - self.scanline_offset
+        for rect in dirty:
+            self.screen.blit(self._scene, rect, rect)
+            self.screen.blit(self._scanlines, rect, rect.move(0, scanline_shift))
         
-        # Draw game over screen
-        if self.done and self.winner:
-            self._draw_game_over_screen()
+        self._drawn_cells = cells
+        self._drawn_items = items
+        self._full_redraw = game_over
+        self.dirty_rects = dirty
         
-        # Add retro scanlines effect
-        self._draw_scanlines()
+        if self.headless:
+            return
+        if dirty == [screen_rect]:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+    
+    def scanline_table(self):
+        """How the scanline overlay changes a pixel, per channel: a (3, 256)
+        uint8 table mapping each scene value to the value on a scanline row
+        (rows ``scanline_offset``, ``scanline_offset + 4``, ...).
+        Measured with the same kind of blit ``render()`` uses."""
+        ramp = pygame.Surface((256, 1), 0, self.screen)
+        pixels = pygame.surfarray.pixels3d(ramp)
+        pixels[:, 0, :] = np.arange(256, dtype=np.uint8)[:, None]
+        del pixels
+        line = pygame.Surface((256, 1), pygame.SRCALPHA)
+        line.fill(self.colors['scanline'])
+        ramp.blit(line, (0, 0))
+        return np.ascontiguousarray(pygame.surfarray.array3d(ramp)[:, 0, :].T)
+    
+    def frame(self, scanlines=True):
+        """The last rendered frame as an (H, W, 3) uint8 view of the screen,
+        or of the scene under the scanline overlay with ``scanlines=False``.
         
-        pygame.display.flip()
+        No pixels are copied, but the view locks the surface: drop it before
+        the next ``render()``.
+        """
+        surface = self.screen if scanlines else self._scene
+        return pygame.surfarray.pixels3d(surface).transpose(1, 0, 2)
     
     def close(self):
-        if self.gui:
+        if self.gui and not self.headless:
             pygame.quit()
+
+
+class VecSnakeGame:
+    """Runs ``num_envs`` independent two-snake matches in lock-step with NumPy.
+
+    Rules, rewards and the observation layout match ``SnakeGame.step``. Cells are
+    stored as flat indices ``y * width + x`` and each snake body is a ring buffer
+    whose head sits at ``head_ptr``. Finished games are reset automatically; their
+    last observation and scores are kept in ``final_states`` and ``final_scores``.
+    
+    With ``self_play`` both snakes are learners, as in ``SnakeGame``: states
+    have shape (num_envs, 2, state_dim) with snake1's mirrored view first, and
+    snake1's reward gets the food shaping too. ``observation`` and
+    ``view_size`` select the observation mode and action frame as in
+    ``SnakeGame``.
+    """
+    
+    WINNERS = (None, "Snake1", "Snake2", "Draw")
+    
+    # Movement deltas indexed by Direction value (UP, RIGHT, DOWN, LEFT)
+    _DX = np.array([0, 1, 0, -1])
+    _DY = np.array([-1, 0, 1, 0])
+    
+    def __init__(self, num_envs, width=36, height=36, seed=None, self_play=False,
+                 observation='grid', view_size=11):
+        if observation not in ('grid', 'local'):
+            raise ValueError(f"observation must be 'grid' or 'local', got {observation!r}")
+        if view_size % 2 == 0:
+            raise ValueError(f"view_size must be odd, got {view_size}")
+        self.num_envs = num_envs
+        self.self_play = self_play
+        self.observation = observation
+        self.view_size = view_size
+        self._view_dx, self._view_dy = _view_offsets(view_size)
+        self._rot_a, self._rot_b = np.array(_ROT_A), np.array(_ROT_B)
+        self.width = width
+        self.height = height
+        self.num_cells = width * height
+        if observation == 'local':
+            self.state_dim = view_size * view_size * 3 + EXTRA_FEATURES
+        else:
+            self.state_dim = self.num_cells * 3 + EXTRA_FEATURES
+        self.rng = np.random.default_rng(seed)
+        
+        n = num_envs
+        self._all = np.arange(n)
+        self.bodies = np.zeros((n, 2, self.num_cells), dtype=np.int64)
+        self.head_ptr = np.zeros((n, 2), dtype=np.int64)
+        self.lengths = np.zeros((n, 2), dtype=np.int64)
+        self.occupancy = np.zeros((n, 2, self.num_cells), dtype=bool)
+        self.directions = np.zeros((n, 2), dtype=np.int64)
+        self.food = np.zeros(n, dtype=np.int64)
+        self.scores = np.zeros((n, 2), dtype=np.int64)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.last_food_distance1 = np.zeros(n, dtype=np.int64)
+        self.last_food_distance2 = np.zeros(n, dtype=np.int64)
+        
+        state_shape = (2, self.state_dim) if self_play else (self.state_dim,)
+        self.final_states = np.zeros((n,) + state_shape, dtype=np.float32)
+        self.final_scores = np.zeros((n, 2), dtype=np.int64)
+        self.reset()
+    
+    def reset(self):
+        self._reset_envs(self._all)
+        return self._observe(self._all)
+    
+    def _reset_envs(self, idx):
+        start1 = (self.height // 2) * self.width + self.width // 4
+        start2 = (self.height // 2) * self.width + 3 * self.width // 4
+        
+        self.occupancy[idx] = False
+        self.head_ptr[idx] = 0
+        self.lengths[idx] = 1
+        self.bodies[idx, 0, 0] = start1
+        self.bodies[idx, 1, 0] = start2
+        self.occupancy[idx, 0, start1] = True
+        self.occupancy[idx, 1, start2] = True
+        self.directions[idx, 0] = Direction.RIGHT.value
+        self.directions[idx, 1] = Direction.LEFT.value
+        self._place_food(idx)
+        self.scores[idx] = 0
+        self.steps[idx] = 0
+        self.last_food_distance1[idx] = self._food_distance(idx, 0)
+        self.last_food_distance2[idx] = self._food_distance(idx)
+    
+    def _place_food(self, idx):
+        if len(idx) == 0:
+            return
+        # Uniform choice among free cells: random keys with occupied cells masked
+        # out. A fully covered board gets food -1, which ends the game.
+        occupied = self.occupancy[idx, 0] | self.occupancy[idx, 1]
+        keys = self.rng.random((len(idx), self.num_cells))
+        keys[occupied] = -1.0
+        self.food[idx] = np.where(occupied.all(axis=1), -1, keys.argmax(axis=1))
+    
+    def _heads(self, idx, snake):
+        return self.bodies[idx, snake, self.head_ptr[idx, snake]]
+    
+    def _food_distance(self, idx, snake=1):
+        head = self._heads(idx, snake)
+        food = self.food[idx]
+        distance = (np.abs(head % self.width - food % self.width) +
+                    np.abs(head // self.width - food // self.width))
+        return np.where(food >= 0, distance, 0)
+    
+    @timed('env.vec_get_states')
+    def _get_states(self, idx, snake=1):
+        """Observations of ``snake`` (0 or 1), each laid out as snake2's would be."""
+        if self.observation == 'local':
+            return self._get_local_states(idx, snake)
+        other = 1 - snake
+        m = len(idx)
+        rows = np.arange(m)
+        states = np.zeros((m, self.state_dim), dtype=np.float32)
+        
+        # Same layout as SnakeGame._get_state: flattened (height, width, 3) grid
+        grid = states[:, :self.num_cells * 3].reshape(m, self.num_cells, 3)
+        grid[:, :, 0] = self.occupancy[idx, other]
+        grid[:, :, 1] = self.occupancy[idx, snake]
+        food = self.food[idx]
+        has_food = food >= 0
+        grid[rows[has_food], food[has_food], 2] = 1.0
+        
+        extra = states[:, self.num_cells * 3:]
+        extra[rows, self.directions[idx, other]] = 1.0
+        extra[rows, 4 + self.directions[idx, snake]] = 1.0
+        
+        # Food direction relative to the snake's head, normalized by Manhattan distance
+        head = self._heads(idx, snake)
+        food_dx = np.where(has_food, food % self.width - head % self.width, 0).astype(np.float32)
+        food_dy = np.where(has_food, food // self.width - head // self.width, 0).astype(np.float32)
+        norm = np.maximum(np.abs(food_dx) + np.abs(food_dy), 1).astype(np.float32)
+        extra[:, 8] = food_dx / norm
+        extra[:, 9] = food_dy / norm
+        return states
+    
+    def _get_local_states(self, idx, snake):
+        """Batched ``SnakeGame._get_local_state``."""
+        other = 1 - snake
+        m = len(idx)
+        head = self._heads(idx, snake)
+        heading = self.directions[idx, snake]
+        xs = (head[:, None] % self.width + self._view_dx[heading]) % self.width
+        ys = (head[:, None] // self.width + self._view_dy[heading]) % self.height
+        cells = ys * self.width + xs
+        rows = idx[:, None]
+        
+        n = cells.shape[1] * 3
+        states = np.zeros((m, self.state_dim), dtype=np.float32)
+        grid = states[:, :n].reshape(m, -1, 3)
+        grid[:, :, 0] = self.occupancy[rows, other, cells]
+        grid[:, :, 1] = self.occupancy[rows, snake, cells]
+        food = self.food[idx]
+        has_food = food >= 0
+        grid[:, :, 2] = cells == food[:, None]
+        
+        # Features as in SnakeGame._get_local_state
+        extra = np.zeros((m, EXTRA_FEATURES))
+        extra[np.arange(m), (self.directions[idx, other] - heading) % 4] = 1.0
+        food_dx = food % self.width - head % self.width
+        food_dy = food // self.width - head // self.width
+        distance = np.abs(food_dx) + np.abs(food_dy)
+        norm = np.maximum(distance, 1)
+        rot_a, rot_b = self._rot_a[heading], self._rot_b[heading]
+        extra[:, 4] = np.where(has_food, (rot_a * food_dx + rot_b * food_dy) / norm, 0.0)
+        extra[:, 5] = np.where(has_food, (-rot_b * food_dx + rot_a * food_dy) / norm, 0.0)
+        extra[:, 6] = np.where(has_food, 1 / (1 + distance), 0.0)
+        extra[:, 7] = np.maximum(0.0, 1 - self.steps[idx] / (100 * (self.scores[idx].sum(axis=1) + 1)))
+        length, other_length = self.lengths[idx, snake], self.lengths[idx, other]
+        extra[:, 8] = length / (length + 10)
+        extra[:, 9] = other_length / (other_length + 10)
+        states[:, n:] = extra
+        return states
+    
+    def _observe(self, idx):
+        if self.self_play:
+            return np.stack((self._get_states(idx, 0), self._get_states(idx, 1)), axis=1)
+        return self._get_states(idx)
+    
+    @timed('env.vec_step')
+    def step(self, actions1=None, actions2=None):
+        """Advance every game one tick.
+        
+        Actions are arrays of shape (num_envs,); ``None`` or a negative entry
+        keeps the current direction, like passing ``None`` to ``SnakeGame.step``.
+        Returns ``(states, rewards, dones, winners)`` where ``rewards`` has shape
+        (num_envs, 2) and ``winners`` indexes ``VecSnakeGame.WINNERS``.
+        """
+        n = self.num_envs
+        rewards = np.zeros((n, 2), dtype=np.float32)
+        dones = np.zeros(n, dtype=bool)
+        winners = np.zeros(n, dtype=np.int8)
+        
+        self.steps += 1
+        
+        # Update directions (learners act relative to their heading with
+        # local observations, see SnakeGame._absolute_actions)
+        if self.observation == 'local':
+            if self.self_play:
+                actions1 = self._relative_to_absolute(0, actions1)
+            actions2 = self._relative_to_absolute(1, actions2)
+        self._update_directions(0, actions1)
+        self._update_directions(1, actions2)
+        
+        # Move snakes (snake1 first, so snake2 may eat freshly placed food)
+        self._move_snakes(0, rewards, dones, winners)
+        self._move_snakes(1, rewards, dones, winners)
+        
+        # Board completely covered: no room for food, decide on score
+        full = self.food < 0
+        
+        # Additional reward for moving toward food (for AI snake)
+        current_food_distance = self._food_distance(self._all)
+        shaping = np.where(current_food_distance < self.last_food_distance2, 1.0,
+                           np.where(current_food_distance > self.last_food_distance2, -0.5, 0.0))
+        rewards[:, 1] += np.where(full, 0.0, shaping)
+        self.last_food_distance2 = current_food_distance
+        
+        # Same shaping for snake1 when it is also a learner
+        if self.self_play:
+            current_food_distance = self._food_distance(self._all, 0)
+            shaping = np.where(current_food_distance < self.last_food_distance1, 1.0,
+                               np.where(current_food_distance > self.last_food_distance1, -0.5, 0.0))
+            rewards[:, 0] += np.where(full, 0.0, shaping)
+            self.last_food_distance1 = current_food_distance
+        
+        # Check for collisions between snakes
+        head1 = self._heads(self._all, 0)
+        head2 = self._heads(self._all, 1)
+        draw = ~full & (head1 == head2)
+        hit1 = ~full & ~draw & self.occupancy[self._all, 1, head1]
+        hit2 = ~full & ~draw & ~hit1 & self.occupancy[self._all, 0, head2]
+        
+        rewards[draw] -= 10
+        winners[draw] = 3
+        rewards[hit1] += (-10, 5)
+        winners[hit1] = 2
+        rewards[hit2] += (5, -10)
+        winners[hit2] = 1
+        
+        # Check for starvation
+        collided = draw | hit1 | hit2
+        starved = ~full & ~collided & (self.steps > 100 * (self.scores.sum(axis=1) + 1))
+        by_score = full | starved
+        score1, score2 = self.scores[:, 0], self.scores[:, 1]
+        winners[by_score] = np.where(score1 > score2, 1, np.where(score2 > score1, 2, 3))[by_score]
+        
+        dones |= collided | by_score
+        states = self._observe(self._all)
+        
+        # Auto-reset finished games
+        finished = np.flatnonzero(dones)
+        if len(finished):
+            self.final_states[finished] = states[finished]
+            self.final_scores[finished] = self.scores[finished]
+            self._reset_envs(finished)
+            states[finished] = self._observe(finished)
+        
+        return states, rewards, dones, winners
+    
+    def _relative_to_absolute(self, snake, actions):
+        if actions is None:
+            return None
+        actions = np.asarray(actions)
+        return np.where(actions >= 0, (actions + self.directions[:, snake]) % 4, actions)
+    
+    def _update_directions(self, snake, actions):
+        if actions is None:
+            return
+        actions = np.asarray(actions)
+        # Any direction except a reversal of the current one is accepted
+        valid = (actions >= 0) & (actions != (self.directions[:, snake] + 2) % 4)
+        self.directions[valid, snake] = actions[valid]
+    
+    def _move_snakes(self, snake, rewards, dones, winners):
+        idx = self._all
+        direction = self.directions[:, snake]
+        head = self._heads(idx, snake)
+        tail = self.bodies[idx, snake, (self.head_ptr[:, snake] - self.lengths[:, snake] + 1) % self.num_cells]
+        
+        # Calculate new head position (wrap-around board)
+        new_x = (head % self.width + self._DX[direction]) % self.width
+        new_y = (head // self.width + self._DY[direction]) % self.height
+        new_head = new_y * self.width + new_x
+        
+        # Check for self-collision (the tail cell is about to be vacated)
+        dead = self.occupancy[idx, snake, new_head] & (new_head != tail)
+        rewards[dead, snake] = -10
+        dones |= dead
+        winners[dead] = 2 if snake == 0 else 1
+        
+        alive = idx[~dead]
+        new_head = new_head[~dead]
+        ate = new_head == self.food[alive]
+        
+        # Vacate the tail first so moving into it stays consistent
+        movers = alive[~ate]
+        self.occupancy[movers, snake, tail[movers]] = False
+        self.lengths[movers, snake] -= 1
+        
+        # Move snake
+        ptr = (self.head_ptr[alive, snake] + 1) % self.num_cells
+        self.head_ptr[alive, snake] = ptr
+        self.bodies[alive, snake, ptr] = new_head
+        self.occupancy[alive, snake, new_head] = True
+        self.lengths[alive, snake] += 1
+        
+        # Food eaten
+        eaters = alive[ate]
+        self.scores[eaters, snake] += 1
+        rewards[eaters, snake] = 10
+        self._place_food(eaters)
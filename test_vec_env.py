@@ -0,0 +1,110 @@
+import random
+
+import numpy as np
+import pytest
+
+from snake_env import SnakeGame, VecSnakeGame
+
+class _SharedFood:
+    """Seeded food placement shared by a SnakeGame and a VecSnakeGame(1).
+
+    The two envs draw food from different RNGs by design, so for parity both
+    get their ``_place_food`` replaced: the k-th placement of an episode run
+    picks the same cell among the free cells (in flat order) in both envs.
+    """
+    def __init__(self, seed):
+        self.seed = seed
+        self.count = 0
+
+    def pick(self, free):
+        self.count += 1
+        if not free:
+            return None
+        return free[random.Random(self.seed * 100003 + self.count).randrange(len(free))]
+
+def _paired_envs(width, height, seed, **options):
+    env = SnakeGame(width=width, height=height, **options)
+    vec = VecSnakeGame(1, width=width, height=height, **options)
+    scalar_food, vec_food = _SharedFood(seed), _SharedFood(seed)
+
+    def scalar_place_food():
+        if env.food is not None:
+            env._mark_food(0.0)
+        cell = scalar_food.pick(sorted(env._free_cells))
+        env.food = None if cell is None else (cell % width, cell // width)
+        if env.food is not None:
+            env._mark_food(1.0)
+        return env.food
+
+    def vec_place_food(idx):
+        if len(idx) == 0:
+            return
+        free = np.flatnonzero(~(vec.occupancy[0, 0] | vec.occupancy[0, 1])).tolist()
+        cell = vec_food.pick(free)
+        vec.food[0] = -1 if cell is None else cell
+
+    env._place_food = scalar_place_food
+    vec._place_food = vec_place_food
+    return env, vec
+
+@pytest.mark.parametrize("width,height", [(12, 12), (5, 4)])
+@pytest.mark.parametrize("options", [{}, {'self_play': True}, {'observation': 'local', 'view_size': 5}],
+                         ids=['grid', 'self_play', 'local'])
+def test_vec_env_matches_scalar_env(width, height, options):
+    """Same actions and food: rewards, dones, winners and states agree on every
+    step, terminal steps included (``final_states`` against the scalar env's
+    last observation, then both envs' fresh episodes)."""
+    for seed in range(15):
+        env, vec = _paired_envs(width, height, seed, **options)
+        state = env.reset()
+        np.testing.assert_array_equal(state, vec.reset()[0])
+        rng = random.Random(seed)
+
+        for step in range(400):
+            action1, action2 = rng.randrange(4), rng.randrange(4)
+            state, rewards, done, winner = env.step(action1, action2)
+            vec_states, vec_rewards, vec_dones, vec_winners = vec.step(np.array([action1]),
+                                                                      np.array([action2]))
+            where = f"seed {seed}, step {step}"
+
+            np.testing.assert_allclose(rewards, vec_rewards[0], err_msg=where)
+            assert done == vec_dones[0], where
+            assert winner == VecSnakeGame.WINNERS[vec_winners[0]], where
+            if done:
+                np.testing.assert_array_equal(state, vec.final_states[0], err_msg=where)
+                np.testing.assert_array_equal(env.reset(), vec_states[0], err_msg=where)
+            else:
+                np.testing.assert_array_equal(state, vec_states[0], err_msg=where)
+
+def test_self_collision_reports_winner():
+    """A snake running into its own body ends the game and names the other
+    snake as winner in both envs (the scalar env used to return None)."""
+    env = SnakeGame(width=12, height=12)
+    vec = VecSnakeGame(1, width=12, height=12)
+    env.reset()
+    vec.reset()
+
+    def step(action1, action2):
+        _, rewards, done, winner = env.step(action1, action2)
+        _, vec_rewards, vec_dones, vec_winners = vec.step(np.array([action1]), np.array([action2]))
+        assert done == vec_dones[0]
+        assert winner == VecSnakeGame.WINNERS[vec_winners[0]]
+        return rewards, done, winner
+
+    # Snake1 heads up out of the way; snake2 (heading left) grows to length 5
+    # by eating food put right in front of it
+    for _ in range(4):
+        x, y = env.snake2[0]
+        env._mark_food(0.0)
+        env.food = ((x - 1) % 12, y)
+        env._mark_food(1.0)
+        vec.food[0] = y * 12 + env.food[0]
+        step(0, 3)
+    assert len(env.snake2) == 5
+
+    # Up, right, down: the head lands on its own body
+    assert not step(0, 0)[1]
+    assert not step(0, 1)[1]
+    rewards, done, winner = step(0, 2)
+    assert done and winner == "Snake1"
+    assert rewards[1] <= -10
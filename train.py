@@ -1,20 +1,290 @@
-from snake_env import SnakeGame
-from dqn_agent import DQNAgent
+from snake_env import SnakeGame, VecSnakeGame
+from dqn_agent import DQNAgent, build_network, configure_threads, save_atomic
+from metrics import MetricsWriter, read_metrics
+from planner import BFSPlanner, VecBFSPlanner
+from profiler import PROFILER
+from recording import record_episode
 import numpy as np
 import torch
+import torch.multiprocessing as mp
+from multiprocessing import shared_memory
+import argparse
+import copy
+import queue
+import random
+import threading
 import time
 import os
 from datetime import datetime
 
-def train():
+# Who plays snake1 while the agent learns snake2
+OPPONENTS = ('idle', 'bfs')
+
+def _check_opponent(opponent, self_play=False):
+    if opponent not in OPPONENTS:
+        raise ValueError(f"opponent must be one of {OPPONENTS}, got {opponent!r}")
+    if self_play and opponent != 'idle':
+        raise ValueError("self_play already controls snake1; use opponent='idle'")
+
+def _network_board(width, height, env_options):
+    """Width and height of the grid inside the observations (the conv
+    network's input image): the board, or the view with local observations."""
+    if env_options.get('observation') == 'local':
+        return env_options['view_size'], env_options['view_size']
+    return width, height
+
+class SharedTransitionRing:
+    """Single-producer ring of transitions in shared memory (actor -> learner).
+
+    The actor writes a transition into slot ``count % capacity`` and then bumps
+    ``count``; the learner copies everything between its own read cursor and
+    ``count``. Pickling only sends the segment name, so a spawned actor attaches
+    to the same memory instead of receiving copies of the arrays.
+    """
+    def __init__(self, capacity, state_dim, name=None):
+        self.capacity = capacity
+        self.state_dim = state_dim
+        nbytes = 8 + capacity * (2 * state_dim * 4 + 8 + 4 + 4)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self._map_arrays()
+        self.read_count = 0
+    
+    def _map_arrays(self):
+        buf = self.shm.buf
+        cap, dim = self.capacity, self.state_dim
+        offset = 0
+        def take(dtype, shape):
+            nonlocal offset
+            array = np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            offset += array.nbytes
+            return array
+        self.count = take(np.int64, (1,))
+        self.states = take(np.float32, (cap, dim))
+        self.next_states = take(np.float32, (cap, dim))
+        self.actions = take(np.int64, (cap,))
+        self.rewards = take(np.float32, (cap,))
+        self.dones = take(np.float32, (cap,))
+    
+    def __getstate__(self):
+        return (self.capacity, self.state_dim, self.shm.name)
+    
+    def __setstate__(self, state):
+        capacity, state_dim, name = state
+        self.__init__(capacity, state_dim, name=name)
+    
+    def add(self, state, action, reward, next_state, done):
+        i = int(self.count[0]) % self.capacity
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        # Publish only after the slot is fully written
+        self.count[0] += 1
+    
+    def drain_into(self, agent):
+        """Copy unread transitions into the agent's replay memory.
+        
+        Returns ``(copied, dropped)``. Transitions the actor has already lapped
+        are skipped. The actor keeps writing while rows are copied, so
+        ``count`` is read again afterwards and any row whose slot it may have
+        started to overwrite meanwhile is dropped (a seqlock-style check), so
+        no torn transition reaches replay.
+        """
+        written = int(self.count[0])
+        dropped = 0
+        oldest = written - self.capacity
+        if self.read_count < oldest:
+            dropped = oldest - self.read_count
+            self.read_count = oldest
+        if written == self.read_count:
+            return 0, dropped
+        
+        idx = np.arange(self.read_count, written) % self.capacity
+        states, next_states = self.states[idx], self.next_states[idx]
+        actions, rewards, dones = self.actions[idx], self.rewards[idx], self.dones[idx]
+        
+        # Transition n is intact unless the actor reached transition
+        # n + capacity (same slot) before the copy finished
+        torn = max(0, int(self.count[0]) - self.capacity + 1 - self.read_count)
+        torn = min(torn, len(idx))
+        if torn < len(idx):
+            agent.remember_batch(states[torn:], actions[torn:], rewards[torn:],
+                                 next_states[torn:], dones[torn:])
+        self.read_count = written
+        return len(idx) - torn, dropped + torn
+    
+    def close(self, unlink=False):
+        # Drop the array views before closing the mapping
+        del self.count, self.states, self.next_states, self.actions, self.rewards, self.dones
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+def _actor_loop(actor_id, width, height, state_dim, action_dim, architecture, ring, shared_model,
+                weights_lock, weights_version, epsilon, step_counts, episode_queue,
+                stop_event, sync_interval, env_options, opponent='idle'):
+    """Play episodes with a local copy of the policy and stream transitions out."""
+    torch.set_num_threads(1)
+    env = SnakeGame(width=width, height=height, gui=False, seed=actor_id, **env_options)
+    planner = BFSPlanner(snake_num=1) if opponent == 'bfs' else None
+    rng = random.Random(actor_id)
+    
+    model = build_network(architecture, state_dim, action_dim,
+                          *_network_board(width, height, env_options))
+    model.eval()
+    local_version = -1
+    steps = 0
+    
+    while not stop_event.is_set():
+        state = env.reset()
+        total_reward = 0
+        episode_steps = 0
+        done = False
+        
+        while not done and not stop_event.is_set():
+            # Pick up new weights from the learner
+            if steps % sync_interval == 0 and weights_version.value != local_version:
+                with weights_lock:
+                    model.load_state_dict(shared_model.state_dict())
+                    local_version = weights_version.value
+            
+            # Epsilon-greedy with the learner's current epsilon
+            if rng.random() <= epsilon.value:
+                action = rng.randint(0, action_dim - 1)
+            else:
+                with torch.no_grad():
+                    action = torch.argmax(model(torch.from_numpy(state))).item()
+            
+            action1 = planner.act(env) if planner is not None else None
+            next_state, (_, reward), done, _ = env.step(action1, action)
+            ring.add(state, action, reward, next_state, done)
+            
+            state = next_state
+            total_reward += reward
+            episode_steps += 1
+            steps += 1
+            step_counts[actor_id] = steps
+        
+        if done:
+            episode_queue.put((actor_id, total_reward, episode_steps, env.score2, env.score1))
+    
+    ring.close()
+
+def _train_agent(agent, env_steps_before, env_steps_after, train_every, gradient_steps_per_update):
+    """Run the gradient updates due for the env steps just collected.
+    
+    Every ``train_every`` env steps earn ``gradient_steps_per_update`` calls to
+    ``agent.replay``. Returns the summed loss and the number of updates made.
+    """
+    due = env_steps_after // train_every - env_steps_before // train_every
+    loss_sum = 0
+    updates = 0
+    for _ in range(due * gradient_steps_per_update):
+        loss = agent.replay()
+        if loss is not None:
+            loss_sum += loss
+            updates += 1
+    return loss_sum, updates
+
+class AsyncCheckpointer:
+    """Writes checkpoint snapshots on a background thread.
+    
+    ``save`` only queues an already-detached snapshot, so the training loop is
+    not blocked by serialization; every file is written atomically via
+    ``save_atomic``. Errors from the writer are re-raised on the next call.
+    """
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+    
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            state, path = job
+            try:
+                save_atomic(state, path)
+            except Exception as e:
+                self.error = e
+    
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError("Checkpoint write failed") from self.error
+    
+    def save(self, state, path):
+        self._check()
+        self.jobs.put((state, path))
+    
+    def close(self):
+        """Wait for queued checkpoints to reach disk."""
+        self.jobs.put(None)
+        self.thread.join()
+        self._check()
+
+def _resolve_resume_path(resume):
+    if os.path.isdir(resume):
+        return os.path.join(resume, "training_state.pth")
+    return resume
+
+def train(prioritized_replay=False, architecture='mlp', num_envs=1, train_every=1,
+          gradient_steps_per_update=1, schedule_unit='update', fast_learner=False,
+          async_eval=False, resume=None, checkpoint_replay=False, print_interval=10,
+          profile=False, profile_hook=None, profile_hook_steps=100, record_eval=False,
+          self_play=False, observation='grid', view_size=11, opponent='idle'):
+    """Single-process training.
+    
+    With ``num_envs > 1`` experience is collected from a VecSnakeGame using
+    batched action selection. ``train_every`` and ``gradient_steps_per_update``
+    set the replay ratio; ``schedule_unit`` chooses whether epsilon decay and
+    target sync tick per gradient update or per env step. ``fast_learner``
+    enables bfloat16 autocast and compiled forward/loss graphs. ``async_eval``
+    evaluates weight snapshots on a background thread instead of pausing.
+    
+    Every ``save_interval`` episodes a resumable ``training_state.pth`` (agent,
+    episode counter, RNG states, metrics and, with ``checkpoint_replay``, the
+    replay memory) is written in the background. ``resume`` takes that file or
+    its run directory and continues the run in place.
+    
+    Per-episode metrics stream to ``metrics.bin`` and evaluations to
+    ``eval_metrics.bin`` (see ``metrics.read_metrics``); the console shows every
+    ``print_interval``-th episode.
+    
+    ``profile`` turns on the hot-path timers and writes their breakdown to
+    ``profile.json`` at every checkpoint; ``profile_hook`` ('cprofile' or
+    'torch') additionally profiles the first ``profile_hook_steps`` iterations.
+    ``record_eval`` records one headless game per evaluation into ``videos/``
+    (see ``recording.py`` for GIF/PNG export).
+    
+    With ``self_play`` the agent also controls snake1 through its mirrored
+    observation: both snakes act from one batched forward and both snakes'
+    transitions go into replay. Logged rewards and scores stay snake2's.
+    
+    ``observation='local'`` trains on a ``view_size`` x ``view_size`` crop
+    around the head instead of the whole board (see ``SnakeGame``), so the
+    network and per-step cost no longer grow with the board.
+    
+    ``opponent`` picks snake1's player: 'idle' keeps it going straight,
+    'bfs' is the scripted ``planner.BFSPlanner`` (also used in evaluation).
+    """
+    _check_opponent(opponent, self_play)
+    
     # Setup device
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     print(f"Using device: {device}")
     
     # Environment setup
-    env = SnakeGame(width=36, height=36, gui=False)
+    env_options = {'observation': observation, 'view_size': view_size}
+    env = SnakeGame(width=36, height=36, gui=False, self_play=self_play, **env_options)
     state_dim = len(env._get_state())
     action_dim = 4
+    net_width, net_height = _network_board(env.width, env.height, env_options)
     
     # Training parameters
     episodes = 4000
@@ -23,6 +293,311 @@ def train():
     eval_interval = 50
     eval_episodes = 10
     
+    # Create directories for saving models and logs (resuming reuses the run's)
+    if resume:
+        resume_path = _resolve_resume_path(resume)
+        model_dir = os.path.dirname(resume_path)
+    else:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        model_dir = f"models/snake_dqn_{timestamp}"
+        os.makedirs(model_dir, exist_ok=True)
+    
+    # Initialize agent
+    agent = DQNAgent(
+        state_dim=state_dim,
+        action_dim=action_dim,
+        device=device,
+        lr=0.00025,
+        gamma=0.99,
+        epsilon=1.0,
+        epsilon_min=0.01,
+        epsilon_decay=0.9995,
+        batch_size=batch_size,
+        target_update_freq=1000,
+        prioritized_replay=prioritized_replay,
+        architecture=architecture,
+        schedule_unit=schedule_unit,
+        mixed_precision=fast_learner,
+        compile_model=fast_learner,
+        width=net_width,
+        height=net_height
+    )
+    
+    record_dir = _make_record_dir(model_dir) if record_eval else None
+    evaluator = (AsyncEvaluator(eval_episodes, record_dir=record_dir, env_options=env_options,
+                                opponent=opponent) if async_eval else None)
+    checkpointer = AsyncCheckpointer()
+    
+    start_episode = 0
+    env_steps = 0
+    loop_state = None
+    train_log_rows = 0
+    eval_log_rows = 0
+    
+    if resume:
+        checkpoint = torch.load(resume_path, map_location=device, weights_only=False)
+        if checkpoint['num_envs'] != num_envs:
+            raise ValueError(f"Checkpoint was trained with num_envs={checkpoint['num_envs']}, not {num_envs}")
+        if checkpoint.get('self_play', False) != self_play:
+            raise ValueError(f"Checkpoint was trained with self_play={not self_play}, not {self_play}")
+        trained_options = checkpoint.get('env_options', {'observation': 'grid', 'view_size': 11})
+        if trained_options != env_options:
+            raise ValueError(f"Checkpoint was trained with {trained_options}, not {env_options}")
+        agent.load_checkpoint_state(checkpoint['agent'])
+        if checkpoint['memory'] is not None:
+            agent.memory.load_state_dict(checkpoint['memory'])
+        train_log_rows = checkpoint['train_log_rows']
+        eval_log_rows = checkpoint['eval_log_rows']
+        start_episode = checkpoint['episode']
+        env_steps = checkpoint['env_steps']
+        loop_state = checkpoint['loop_state']
+        random.setstate(checkpoint['random_state'])
+        np.random.set_state(checkpoint['numpy_random_state'])
+        torch.set_rng_state(checkpoint['torch_random_state'])
+        env.rng.setstate(checkpoint['env_random_state'])
+        print(f"Resumed from {resume_path} at episode {start_episode}")
+    
+    # Training metrics (rows written after the resumed checkpoint are dropped)
+    train_log = MetricsWriter(os.path.join(model_dir, "metrics.bin"), TRAIN_FIELDS,
+                              keep_rows=train_log_rows)
+    eval_log = MetricsWriter(os.path.join(model_dir, "eval_metrics.bin"), EVAL_FIELDS,
+                             keep_rows=eval_log_rows)
+    throughput = _Throughput(env_steps, agent.steps)
+    _start_profiling(model_dir, profile, profile_hook, profile_hook_steps)
+    
+    def save_checkpoint(e, loop_state=None):
+        train_log.flush()
+        eval_log.flush()
+        if PROFILER.enabled:
+            PROFILER.export(os.path.join(model_dir, "profile.json"))
+        
+        # Snapshot on this thread; serialization happens in the background
+        model_path = os.path.join(model_dir, f"snake_dqn_episode_{e}.pth")
+        agent_state = agent.checkpoint_state()
+        checkpointer.save(agent_state, model_path)
+        checkpointer.save({
+            'agent': agent_state,
+            'episode': e,
+            'env_steps': env_steps,
+            'num_envs': num_envs,
+            'self_play': self_play,
+            'env_options': env_options,
+            'loop_state': loop_state,
+            'memory': agent.memory.state_dict() if checkpoint_replay else None,
+            'train_log_rows': train_log.rows,
+            'eval_log_rows': eval_log.rows,
+            'random_state': random.getstate(),
+            'numpy_random_state': np.random.get_state(),
+            'torch_random_state': torch.get_rng_state(),
+            'env_random_state': env.rng.getstate(),
+        }, os.path.join(model_dir, "training_state.pth"))
+        print(f"Model saved to {model_path}")
+    
+    def end_episode(e, total_reward, avg_loss, steps, score, opponent_score):
+        # Store metrics
+        env_rate, update_rate = throughput.update(env_steps, agent.steps)
+        train_log.append(episode=e, env_steps=env_steps, updates=agent.steps,
+                         reward=total_reward, avg_loss=avg_loss, length=steps,
+                         score=score, opponent_score=opponent_score, epsilon=agent.epsilon,
+                         env_steps_per_sec=env_rate, updates_per_sec=update_rate,
+                         wall_time=throughput.elapsed())
+        
+        # Evaluation
+        if evaluator is not None:
+            for eval_episode, result in evaluator.poll():
+                _record_evaluation(eval_log, eval_episode, result)
+        if e % eval_interval == 0:
+            if evaluator is not None:
+                evaluator.submit(agent, e)
+            else:
+                _record_evaluation(eval_log, e, evaluate_agent(
+                    agent, eval_episodes, record_path=_record_path(record_dir, e),
+                    env_options=env_options, opponent=opponent))
+        
+        # Print progress
+        if e % print_interval == 0:
+            print(f"Episode: {e}/{episodes}, Reward: {total_reward:.2f}, "
+                  f"Avg Loss: {avg_loss:.4f}, Epsilon: {agent.epsilon:.4f}, "
+                  f"Steps: {steps}, Env steps/s: {env_rate:.0f}, Updates/s: {update_rate:.1f}")
+    
+    # Training loop
+    if num_envs == 1:
+        planner = BFSPlanner(snake_num=1) if opponent == 'bfs' else None
+        for e in range(start_episode + 1, episodes + 1):
+            state = env.reset()
+            total_reward = 0
+            episode_loss = 0
+            steps = 0
+            done = False
+            
+            while not done:
+                if self_play:
+                    # One forward for both snakes; both transitions are stored
+                    actions = agent.act_batch(state)
+                    next_state, rewards, done, _ = env.step(actions[0], actions[1])
+                    reward = rewards[1]
+                    with PROFILER.timer('replay.add'):
+                        agent.remember_batch(state, actions, np.array(rewards, dtype=np.float32),
+                                             next_state, np.full(2, done, dtype=np.float32))
+                else:
+                    # Agent acts in the environment
+                    action = agent.act(state)
+                    action1 = planner.act(env) if planner is not None else None
+                    next_state, (_, reward), done, _ = env.step(action1, action)
+                    
+                    # Store experience
+                    with PROFILER.timer('replay.add'):
+                        agent.remember(state, action, reward, next_state, done)
+                
+                # Train the agent
+                loss_sum, _ = _train_agent(agent, env_steps, env_steps + 1,
+                                           train_every, gradient_steps_per_update)
+                episode_loss += loss_sum
+                env_steps += 1
+                PROFILER.count('env_steps')
+                PROFILER.step()
+                
+                state = next_state
+                total_reward += reward
+                steps += 1
+            
+            # Calculate average loss
+            avg_loss = episode_loss / steps if steps > 0 else 0
+            end_episode(e, total_reward, avg_loss, steps, env.score2, env.score1)
+            
+            # Save model
+            if e % save_interval == 0:
+                save_checkpoint(e)
+    else:
+        if loop_state is not None:
+            # Continue the in-flight games exactly where the checkpoint left them
+            vec_env = loop_state['vec_env']
+            states = loop_state['states']
+            episode_rewards = loop_state['episode_rewards']
+            episode_steps = loop_state['episode_steps']
+            loss_sum = loop_state['loss_sum']
+            updates = loop_state['updates']
+        else:
+            vec_env = VecSnakeGame(num_envs, width=36, height=36, self_play=self_play, **env_options)
+            states = vec_env.reset()
+            episode_rewards = np.zeros(num_envs)
+            episode_steps = np.zeros(num_envs, dtype=np.int64)
+            loss_sum = 0
+            updates = 0
+        vec_planner = VecBFSPlanner(snake=0) if opponent == 'bfs' else None
+        e = start_episode
+        
+        while e < episodes:
+            # Agent acts in every environment at once
+            if self_play:
+                # Both snakes of every game in one forward pass
+                actions = agent.act_batch(states.reshape(-1, state_dim)).reshape(num_envs, 2)
+                next_states, rewards, dones, _ = vec_env.step(actions[:, 0], actions[:, 1])
+            else:
+                actions = agent.act_batch(states)
+                actions1 = vec_planner.act(vec_env) if vec_planner is not None else None
+                next_states, rewards, dones, _ = vec_env.step(actions1, actions)
+            
+            # Store experience (finished games were reset, keep their last state)
+            with PROFILER.timer('replay.add'):
+                if self_play:
+                    stored_next = np.where(dones[:, None, None], vec_env.final_states, next_states)
+                    agent.remember_batch(states.reshape(-1, state_dim), actions.reshape(-1),
+                                         rewards.reshape(-1), stored_next.reshape(-1, state_dim),
+                                         np.repeat(dones, 2))
+                else:
+                    stored_next = np.where(dones[:, None], vec_env.final_states, next_states)
+                    agent.remember_batch(states, actions, rewards[:, 1], stored_next, dones)
+            
+            # Train the agent
+            batch_loss, batch_updates = _train_agent(agent, env_steps, env_steps + num_envs,
+                                                     train_every, gradient_steps_per_update)
+            loss_sum += batch_loss
+            updates += batch_updates
+            env_steps += num_envs
+            PROFILER.count('env_steps', num_envs)
+            PROFILER.step()
+            
+            states = next_states
+            episode_rewards += rewards[:, 1]
+            episode_steps += 1
+            
+            save_due = None
+            for i in np.flatnonzero(dones):
+                if e == episodes:
+                    break
+                e += 1
+                
+                # Average loss over the updates since the previous finished episode
+                avg_loss = loss_sum / updates if updates > 0 else 0
+                loss_sum = 0
+                updates = 0
+                end_episode(e, episode_rewards[i], avg_loss, episode_steps[i],
+                            vec_env.final_scores[i, 1], vec_env.final_scores[i, 0])
+                episode_rewards[i] = 0
+                episode_steps[i] = 0
+                if e % save_interval == 0:
+                    save_due = e
+            
+            # Save model
+            if save_due is not None:
+                save_checkpoint(save_due, {
+                    'vec_env': copy.deepcopy(vec_env),
+                    'states': states.copy(),
+                    'episode_rewards': episode_rewards.copy(),
+                    'episode_steps': episode_steps.copy(),
+                    'loss_sum': loss_sum,
+                    'updates': updates,
+                })
+    
+    if evaluator is not None:
+        for eval_episode, result in evaluator.close():
+            _record_evaluation(eval_log, eval_episode, result)
+    
+    # Save final model
+    final_path = os.path.join(model_dir, "snake_dqn_final.pth")
+    checkpointer.save(agent.checkpoint_state(), final_path)
+    checkpointer.close()
+    print(f"Final model saved to {final_path}")
+    
+    # Save training metrics
+    train_log.close()
+    eval_log.close()
+    _export_histories(model_dir)
+    _finish_profiling(model_dir)
+
+def train_parallel(num_actors=4, episodes=4000, ring_capacity=2048, weight_sync_interval=100,
+                   actor_sync_interval=50, report_interval=10.0, prioritized_replay=False,
+                   architecture='mlp', schedule_unit='update', fast_learner=False,
+                   print_interval=10, profile=False, profile_hook=None, profile_hook_steps=100,
+                   record_eval=False, observation='grid', view_size=11, opponent='idle'):
+    """Actor/learner training: ``num_actors`` processes play SnakeGame copies
+    while this process runs DQNAgent updates on what they send back.
+    
+    Transitions travel through per-actor shared-memory rings and the learner
+    publishes its weights into a shared-memory model every
+    ``weight_sync_interval`` updates. Profiling (see ``train``) covers the
+    learner process only. ``opponent`` is as in ``train``.
+    """
+    _check_opponent(opponent)
+    
+    # Setup device
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    print(f"Using device: {device}, actors: {num_actors}")
+    
+    # Environment setup
+    width, height = 36, 36
+    env_options = {'observation': observation, 'view_size': view_size}
+    state_dim = len(SnakeGame(width=width, height=height, gui=False, **env_options)._get_state())
+    action_dim = 4
+    net_width, net_height = _network_board(width, height, env_options)
+    
+    # Training parameters
+    batch_size = 128
+    save_interval = 100
+    eval_interval = 50
+    eval_episodes = 10
+    
     # Create directories for saving models and logs
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     model_dir = f"models/snake_dqn_{timestamp}"
@@ -39,62 +614,141 @@ def train():
         epsilon_min=0.01,
         epsilon_decay=0.9995,
         batch_size=batch_size,
-        target_update_freq=1000
+        target_update_freq=1000,
+        prioritized_replay=prioritized_replay,
+        architecture=architecture,
+        schedule_unit=schedule_unit,
+        mixed_precision=fast_learner,
+        compile_model=fast_learner,
+        width=net_width,
+        height=net_height
     )
     
+    record_dir = _make_record_dir(model_dir) if record_eval else None
+    
+    # Shared state between learner and actors
+    ctx = mp.get_context("spawn")
+    shared_model = build_network(architecture, state_dim, action_dim, net_width, net_height)
+    shared_model.load_state_dict(agent.model.state_dict())
+    shared_model.share_memory()
+    weights_lock = ctx.Lock()
+    weights_version = ctx.Value('q', 0, lock=False)
+    epsilon = ctx.Value('d', agent.epsilon, lock=False)
+    step_counts = ctx.Array('q', num_actors, lock=False)
+    episode_queue = ctx.Queue()
+    stop_event = ctx.Event()
+    rings = [SharedTransitionRing(ring_capacity, state_dim) for _ in range(num_actors)]
+    
+    actors = [
+        ctx.Process(target=_actor_loop, daemon=True, args=(
+            i, width, height, state_dim, action_dim, architecture, rings[i], shared_model,
+            weights_lock, weights_version, epsilon, step_counts, episode_queue,
+            stop_event, actor_sync_interval, env_options, opponent))
+        for i in range(num_actors)
+    ]
+    for actor in actors:
+        actor.start()
+    
     # Training metrics
-    rewards_history = []
-    loss_history = []
-    eval_results = []
+    train_log = MetricsWriter(os.path.join(model_dir, "metrics.bin"), TRAIN_FIELDS)
+    eval_log = MetricsWriter(os.path.join(model_dir, "eval_metrics.bin"), EVAL_FIELDS)
+    throughput = _Throughput(0, agent.steps)
+    _start_profiling(model_dir, profile, profile_hook, profile_hook_steps)
+    episode_loss = 0
+    episode_updates = 0
+    dropped = 0
+    e = 0
     
-    # Training loop
-    for e in range(1, episodes + 1):
-        state = env.reset()
-        total_reward = 0
-        episode_loss = 0
-        steps = 0
-        done = False
-        
-        while not done:
-            # Agent acts in the environment
-            action = agent.act(state)
-            next_state, (reward, _), done, _ = env.step(action2=action)
-            
-            # Store experience
-            agent.remember(state, action, reward, next_state, done)
+    last_report = time.time()
+    last_counts = np.zeros(num_actors, dtype=np.int64)
+    
+    try:
+        while e < episodes:
+            # Collect transitions from every actor
+            received = 0
+            with PROFILER.timer('replay.add'):
+                for ring in rings:
+                    copied, lost = ring.drain_into(agent)
+                    received += copied
+                    dropped += lost
+            PROFILER.count('env_steps', received)
             
             # Train the agent
             loss = agent.replay()
             if loss is not None:
                 episode_loss += loss
+                episode_updates += 1
+                epsilon.value = agent.epsilon
+                
+                # Broadcast weights to the actors
+                if agent.steps % weight_sync_interval == 0:
+                    with weights_lock:
+                        shared_model.load_state_dict(agent.model.state_dict())
+                        weights_version.value += 1
+            elif received == 0:
+                time.sleep(0.001)
+            PROFILER.step()
             
-            state = next_state
-            total_reward += reward
-            steps += 1
-        
-        # Calculate average loss
-        avg_loss = episode_loss / steps if steps > 0 else 0
-        
-        # Store metrics
-        rewards_history.append(total_reward)
-        loss_history.append(avg_loss)
-        
-        # Evaluation
-        if e % eval_interval == 0:
-            avg_eval_reward = evaluate_agent(agent, env, eval_episodes, device)
-            eval_results.append((e, avg_eval_reward))
-            print(f"Evaluation after episode {e}: Average Reward = {avg_eval_reward:.2f}")
-        
-        # Print progress
-        print(f"Episode: {e}/{episodes}, Reward: {total_reward:.2f}, "
-              f"Avg Loss: {avg_loss:.4f}, Epsilon: {agent.epsilon:.4f}, "
-              f"Steps: {steps}")
-        
-        # Save model
-        if e % save_interval == 0:
-            model_path = os.path.join(model_dir, f"snake_dqn_episode_{e}.pth")
-            agent.save(model_path)
-            print(f"Model saved to {model_path}")
+            # Finished episodes
+            while e < episodes:
+                try:
+                    actor_id, total_reward, steps, score, opponent_score = episode_queue.get_nowait()
+                except queue.Empty:
+                    break
+                e += 1
+                
+                avg_loss = episode_loss / episode_updates if episode_updates > 0 else 0
+                episode_loss = 0
+                episode_updates = 0
+                
+                # Store metrics
+                env_steps = sum(step_counts[:])
+                env_rate, update_rate = throughput.update(env_steps, agent.steps)
+                train_log.append(episode=e, env_steps=env_steps, updates=agent.steps,
+                                 reward=total_reward, avg_loss=avg_loss, length=steps,
+                                 score=score, opponent_score=opponent_score, epsilon=agent.epsilon,
+                                 env_steps_per_sec=env_rate, updates_per_sec=update_rate,
+                                 wall_time=throughput.elapsed())
+                
+                # Evaluation
+                if e % eval_interval == 0:
+                    _record_evaluation(eval_log, e, evaluate_agent(
+                        agent, eval_episodes, width, height,
+                        record_path=_record_path(record_dir, e), env_options=env_options,
+                        opponent=opponent))
+                
+                # Print progress
+                if e % print_interval == 0:
+                    print(f"Episode: {e}/{episodes} (actor {actor_id}), Reward: {total_reward:.2f}, "
+                          f"Avg Loss: {avg_loss:.4f}, Epsilon: {agent.epsilon:.4f}, "
+                          f"Steps: {steps}")
+                
+                # Save model
+                if e % save_interval == 0:
+                    model_path = os.path.join(model_dir, f"snake_dqn_episode_{e}.pth")
+                    agent.save(model_path)
+                    print(f"Model saved to {model_path}")
+                    if PROFILER.enabled:
+                        PROFILER.export(os.path.join(model_dir, "profile.json"))
+            
+            # Throughput report
+            now = time.time()
+            if now - last_report >= report_interval:
+                counts = np.array(step_counts[:], dtype=np.int64)
+                rates = (counts - last_counts) / (now - last_report)
+                per_actor = ", ".join(f"{rate:.0f}" for rate in rates)
+                print(f"Env steps/sec: {rates.sum():.0f} total [{per_actor}], "
+                      f"updates: {agent.steps}, dropped transitions: {dropped}")
+                last_counts = counts
+                last_report = now
+    finally:
+        stop_event.set()
+        for actor in actors:
+            actor.join(timeout=5)
+            if actor.is_alive():
+                actor.terminate()
+        for ring in rings:
+            ring.close(unlink=True)
     
     # Save final model
     final_path = os.path.join(model_dir, "snake_dqn_final.pth")
@@ -102,27 +756,259 @@ def train():
     print(f"Final model saved to {final_path}")
     
     # Save training metrics
-    np.save(os.path.join(model_dir, "rewards_history.npy"), np.array(rewards_history))
-    np.save(os.path.join(model_dir, "loss_history.npy"), np.array(loss_history))
-    np.save(os.path.join(model_dir, "eval_results.npy"), np.array(eval_results))
+    train_log.close()
+    eval_log.close()
+    _export_histories(model_dir)
+    _finish_profiling(model_dir)
+
+# Columns of the per-episode training log (metrics.bin)
+TRAIN_FIELDS = ('episode', 'env_steps', 'updates', 'reward', 'avg_loss', 'length', 'score',
+                'opponent_score', 'epsilon', 'env_steps_per_sec', 'updates_per_sec', 'wall_time')
+
+# Columns of the evaluation log (eval_metrics.bin) and the exported eval_results.npy
+EVAL_FIELDS = ('episode', 'reward_mean', 'reward_std', 'score_mean', 'score_std', 'win_rate')
+
+def _start_profiling(model_dir, profile, hook, hook_steps):
+    if not profile:
+        return
+    PROFILER.enable()
+    if hook is not None:
+        filename = "profile.pstats" if hook == 'cprofile' else "profile_trace.json"
+        PROFILER.profile_steps(hook_steps, hook, os.path.join(model_dir, filename))
+
+def _finish_profiling(model_dir):
+    if not PROFILER.enabled:
+        return
+    PROFILER.export(os.path.join(model_dir, "profile.json"))
+    print(PROFILER.format())
+    PROFILER.disable()
 
-def evaluate_agent(agent, env, num_episodes, device):
-    total_reward = 0
+class _Throughput:
+    """Env steps/sec and updates/sec, re-measured at most once per ``window`` seconds
+    so episodes finishing on the same tick do not produce spikes."""
+    def __init__(self, env_steps, updates, window=1.0):
+        self.start = self.last_time = time.time()
+        self.last_env_steps = env_steps
+        self.last_updates = updates
+        self.window = window
+        self.rates = (0.0, 0.0)
     
-    for _ in range(num_episodes):
-        state = env.reset()
-        episode_reward = 0
-        done = False
-        
-        while not done:
-            action = agent.act(state, evaluation=True)
-            next_state, (reward, _), done, _ = env.step(action2=action)
-            state = next_state
-            episode_reward += reward
+    def update(self, env_steps, updates):
+        now = time.time()
+        elapsed = now - self.last_time
+        if elapsed >= self.window:
+            self.rates = ((env_steps - self.last_env_steps) / elapsed,
+                          (updates - self.last_updates) / elapsed)
+            self.last_time = now
+            self.last_env_steps = env_steps
+            self.last_updates = updates
+        return self.rates
+    
+    def elapsed(self):
+        return time.time() - self.start
+
+def _export_histories(model_dir):
+    """Write the .npy histories earlier runs produced, from the streamed logs."""
+    train_log = read_metrics(os.path.join(model_dir, "metrics.bin"))
+    eval_log = read_metrics(os.path.join(model_dir, "eval_metrics.bin"))
+    np.save(os.path.join(model_dir, "rewards_history.npy"), np.array(train_log['reward']))
+    np.save(os.path.join(model_dir, "loss_history.npy"), np.array(train_log['avg_loss']))
+    np.save(os.path.join(model_dir, "eval_results.npy"),
+            np.stack([eval_log[field] for field in EVAL_FIELDS], axis=1))
+
+def _make_record_dir(model_dir):
+    record_dir = os.path.join(model_dir, "videos")
+    os.makedirs(record_dir, exist_ok=True)
+    return record_dir
+
+def _record_path(record_dir, episode):
+    if record_dir is None:
+        return None
+    return os.path.join(record_dir, f"eval_episode_{episode}.snkv")
+
+def _run_evaluation(policy, num_episodes, width=36, height=36, seed=0, record_path=None,
+                    env_options=None, opponent='idle'):
+    """Play ``num_episodes`` games at once in a dedicated VecSnakeGame.
+    
+    ``policy`` maps an (N, state_dim) batch of states to N actions for the AI
+    snake. Each environment plays exactly one episode; games reset after they
+    finish are ignored. With ``record_path`` one more game is played in a
+    headless SnakeGame and its frames are recorded there. ``env_options``
+    (observation mode and view size) must match what the policy was trained on;
+    ``opponent`` plays snake1 (see ``train``).
+    """
+    env_options = env_options or {}
+    envs = VecSnakeGame(num_episodes, width=width, height=height, seed=seed, **env_options)
+    planner = VecBFSPlanner(snake=0) if opponent == 'bfs' else None
+    states = envs.reset()
+    rewards = np.zeros(num_episodes)
+    scores = np.zeros(num_episodes)
+    wins = np.zeros(num_episodes, dtype=bool)
+    active = np.ones(num_episodes, dtype=bool)
+    actions = np.zeros(num_episodes, dtype=np.int64)
+    
+    while active.any():
+        actions[active] = policy(states[active])
+        actions1 = planner.act(envs) if planner is not None else None
+        states, step_rewards, dones, winners = envs.step(actions1, actions)
+        rewards[active] += step_rewards[active, 1]
         
-        total_reward += episode_reward
+        finished = active & dones
+        scores[finished] = envs.final_scores[finished, 1]
+        wins[finished] = winners[finished] == 2
+        active &= ~dones
+    
+    if record_path is not None:
+        record_episode(policy, record_path, width, height, seed, env_options=env_options,
+                       opponent=opponent)
     
-    return total_reward / num_episodes
+    return {
+        'reward_mean': rewards.mean(),
+        'reward_std': rewards.std(),
+        'score_mean': scores.mean(),
+        'score_std': scores.std(),
+        'win_rate': wins.mean(),
+    }
+
+def evaluate_agent(agent, num_episodes, width=36, height=36, seed=0, record_path=None,
+                   env_options=None, opponent='idle'):
+    """Greedy evaluation in its own environments, batching all episodes' decisions."""
+    return _run_evaluation(lambda states: agent.act_batch(states, evaluation=True),
+                           num_episodes, width, height, seed, record_path, env_options, opponent)
+
+class AsyncEvaluator:
+    """Evaluates weight snapshots on a background thread so training keeps going.
+    
+    ``submit`` copies the agent's current network; finished results are
+    collected with ``poll`` (or ``close`` at the end of training).
+    """
+    def __init__(self, num_episodes, width=36, height=36, seed=0, record_dir=None, env_options=None,
+                 opponent='idle'):
+        self.num_episodes = num_episodes
+        self.record_dir = record_dir
+        self.env_options = env_options
+        self.opponent = opponent
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._worker, daemon=True)
+        self.thread.start()
+    
+    def _worker(self):
+        # Evaluation runs alongside training; keep its env steps and forward
+        # passes out of the training profile
+        PROFILER.mute_thread()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            episode, model, device = job
+            
+            def policy(states):
+                with torch.no_grad():
+                    q_values = model(torch.from_numpy(states).to(device))
+                return torch.argmax(q_values, dim=1).cpu().numpy()
+            
+            result = _run_evaluation(policy, self.num_episodes, self.width, self.height, self.seed,
+                                     _record_path(self.record_dir, episode), self.env_options,
+                                     self.opponent)
+            self.results.put((episode, result))
+    
+    def submit(self, agent, episode):
+        model = copy.deepcopy(agent.model)
+        model.eval()
+        self.jobs.put((episode, model, agent.device))
+    
+    def poll(self):
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                return finished
+    
+    def close(self):
+        """Wait for pending evaluations and return their results."""
+        self.jobs.put(None)
+        self.thread.join()
+        return self.poll()
+
+def _record_evaluation(eval_log, episode, result):
+    eval_log.append(episode=episode, **result)
+    print(f"Evaluation after episode {episode}: "
+          f"Reward = {result['reward_mean']:.2f} ± {result['reward_std']:.2f}, "
+          f"Score = {result['score_mean']:.2f} ± {result['score_std']:.2f}, "
+          f"Win Rate = {result['win_rate']:.0%}")
 
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the DQN snake agent")
+    parser.add_argument("--actors", type=int, default=0,
+                        help="number of actor processes (0 = single-process training)")
+    parser.add_argument("--prioritized", action="store_true",
+                        help="use prioritized experience replay instead of uniform sampling")
+    parser.add_argument("--architecture", choices=["mlp", "conv"], default="mlp",
+                        help="Q-network architecture")
+    parser.add_argument("--num-envs", type=int, default=1,
+                        help="environments stepped together between updates (single-process mode)")
+    parser.add_argument("--train-every", type=int, default=1,
+                        help="env steps between gradient updates (single-process mode)")
+    parser.add_argument("--gradient-steps", type=int, default=1,
+                        help="gradient steps per update (single-process mode)")
+    parser.add_argument("--schedule-unit", choices=["update", "env"], default="update",
+                        help="whether epsilon decay and target sync count updates or env steps")
+    parser.add_argument("--fast-learner", action="store_true",
+                        help="bfloat16 autocast and torch.compile for the learner")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="PyTorch intra-op CPU threads")
+    parser.add_argument("--interop-threads", type=int, default=None,
+                        help="PyTorch inter-op CPU threads")
+    parser.add_argument("--async-eval", action="store_true",
+                        help="evaluate weight snapshots in the background (single-process mode)")
+    parser.add_argument("--print-every", type=int, default=10,
+                        help="print every N-th episode to the console")
+    parser.add_argument("--profile", action="store_true",
+                        help="time env, agent and learner phases and write profile.json")
+    parser.add_argument("--profile-hook", choices=["cprofile", "torch"], default=None,
+                        help="also run cProfile or the torch profiler (implies --profile)")
+    parser.add_argument("--profile-hook-steps", type=int, default=100,
+                        help="training iterations covered by --profile-hook")
+    parser.add_argument("--self-play", action="store_true",
+                        help="the agent plays both snakes and learns from both (single-process mode)")
+    parser.add_argument("--observation", choices=["grid", "local"], default="grid",
+                        help="whole-board grid or a head-centred local view that faces the snake's heading")
+    parser.add_argument("--view-size", type=int, default=11,
+                        help="side of the local view in cells (odd)")
+    parser.add_argument("--opponent", choices=OPPONENTS, default="idle",
+                        help="snake1's player in training and evaluation: idle or the BFS planner")
+    parser.add_argument("--record-eval", action="store_true",
+                        help="record one headless game per evaluation into the run's videos/ directory")
+    parser.add_argument("--resume", default=None,
+                        help="training_state.pth (or its run directory) to continue from")
+    parser.add_argument("--checkpoint-replay", action="store_true",
+                        help="include the replay memory in resumable checkpoints")
+    args = parser.parse_args()
+    
+    configure_threads(args.threads, args.interop_threads)
+    profile = args.profile or args.profile_hook is not None
+    
+    if args.actors > 0:
+        train_parallel(num_actors=args.actors, prioritized_replay=args.prioritized,
+                       architecture=args.architecture, schedule_unit=args.schedule_unit,
+                       fast_learner=args.fast_learner, print_interval=args.print_every,
+                       profile=profile, profile_hook=args.profile_hook,
+                       profile_hook_steps=args.profile_hook_steps, record_eval=args.record_eval,
+                       observation=args.observation, view_size=args.view_size,
+                       opponent=args.opponent)
+    else:
+        train(prioritized_replay=args.prioritized, architecture=args.architecture,
+              num_envs=args.num_envs, train_every=args.train_every,
+              gradient_steps_per_update=args.gradient_steps,
+              schedule_unit=args.schedule_unit, fast_learner=args.fast_learner,
+              async_eval=args.async_eval, resume=args.resume,
+              checkpoint_replay=args.checkpoint_replay, print_interval=args.print_every,
+              profile=profile, profile_hook=args.profile_hook,
+              profile_hook_steps=args.profile_hook_steps, record_eval=args.record_eval,
+              self_play=args.self_play, observation=args.observation, view_size=args.view_size,
+              opponent=args.opponent)
\ No newline at end of file